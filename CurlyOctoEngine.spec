@@ -1,11 +1,16 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# Ship the columnar snapshot next to the database when the loader made one
+datas = [('db.sqlite', '.'), ('styles.qss', '.')]
+if os.path.isdir('db.snapshot'):
+    datas.append(('db.snapshot', 'db.snapshot'))
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('db.sqlite', '.'), ('styles.qss', '.')],
+    datas=datas,
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
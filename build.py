@@ -1,11 +1,12 @@
 # build.py
 import PyInstaller.__main__
+import argparse
 import os
 import subprocess
 import shutil
 from pathlib import Path
 
-def build():
+def build(onedir=False):
     # Get absolute paths
     current_dir = Path.cwd()
     build_dir = current_dir / 'build'
@@ -17,13 +18,20 @@ def build():
         if dir.exists():
             shutil.rmtree(dir)
     
-    # Create exe
+    # Ship the columnar snapshot next to the database when the loader made one
+    snapshot_args = []
+    if (current_dir / 'db.snapshot').is_dir():
+        snapshot_args = ['--add-data', 'db.snapshot;db.snapshot']
+
+    # --onefile unpacks the whole bundle, database included, to a temp
+    # directory on every launch; --onedir installs it unpacked once
     PyInstaller.__main__.run([
         'main.py',
-        '--onefile',
+        '--onedir' if onedir else '--onefile',
         '--noconsole',
         '--add-data', 'db.sqlite;.',
         '--add-data', 'styles.qss;.',
+        *snapshot_args,
         '--icon', 'app_icon.ico',
         '--name', 'CurlyOctoEngine'
     ])
@@ -36,8 +44,9 @@ def build():
     if os.path.exists(inno_compiler):
         # Use absolute paths
         script_path = current_dir / 'installer_script.iss'
+        defines = ['/DOnedir'] if onedir else []
         process = subprocess.run(
-            [inno_compiler, str(script_path)], 
+            [inno_compiler, *defines, str(script_path)], 
             capture_output=True, 
             text=True
         )
@@ -58,4 +67,8 @@ def build():
         print("Inno Setup not found. Please install it first.")
 
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the Curly Octo Engine exe and installer.")
+    parser.add_argument("--onedir", action="store_true",
+                        help="ship an unpacked app folder instead of a self-extracting exe")
+    args = parser.parse_args()
+    build(args.onedir)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+MMAP_SIZE = 256 * 1024 ** 2
+CACHE_SIZE_KB = 64 * 1024
+CACHED_STATEMENTS = 256
+
+def read_only_uri(db_path):
+    return Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+
+def file_identity(db_path):
+    stat = os.stat(db_path)
+    return (stat.st_dev, stat.st_ino)
+
+def open_read_only(db_path, mmap_size=MMAP_SIZE, cache_size_kb=CACHE_SIZE_KB):
+    # mode=ro makes SQLite refuse to write the file at all, query_only also
+    # rejects writes to temp tables and ATTACHed databases
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_kb)}")
+    return conn
+
+class ConnectionManager:
+    # One read-only connection per thread, kept open so each query reuses the
+    # page cache, the memory map and prepared statements of the last one.
+    # Keyed by thread id rather than threading.local, Qt pool threads drop
+    # their Python thread state between tasks
+    def __init__(self, db_path, mmap_size=MMAP_SIZE, cache_size_kb=CACHE_SIZE_KB):
+        self.db_path = os.path.abspath(db_path)
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._connections = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def connection(self):
+        thread_id = threading.get_ident()
+        identity = file_identity(self.db_path)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker process, the inherited connections belong to the parent
+                self._connections = {}
+                self._pid = os.getpid()
+            entry = self._connections.get(thread_id)
+        if entry is not None:
+            conn, opened_identity = entry
+            if opened_identity == identity:
+                return conn
+            # The file was replaced, the old connection still reads the old one
+            conn.close()
+        conn = open_read_only(self.db_path, self.mmap_size, self.cache_size_kb)
+        with self._lock:
+            self._connections[thread_id] = (conn, identity)
+        return conn
+
+    def close_all(self):
+        with self._lock:
+            entries, self._connections = list(self._connections.values()), {}
+        for conn, _ in entries:
+            conn.close()
+
+    def __len__(self):
+        return len(self._connections)
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_connection_manager(db_path):
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(key)
+        return manager
+
+def close_connections():
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.close_all()
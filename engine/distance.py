@@ -0,0 +1,40 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_TO_MILES = 0.621371192
+
+MILES = "mi"
+KILOMETERS = "km"
+
+EARTH_RADIUS = {
+    KILOMETERS: EARTH_RADIUS_KM,
+    MILES: EARTH_RADIUS_KM * KM_TO_MILES,
+}
+
+def earth_radius(unit=MILES):
+    try:
+        return EARTH_RADIUS[unit]
+    except KeyError:
+        raise ValueError(f"Unknown distance unit: {unit}. Use '{MILES}' or '{KILOMETERS}'.")
+
+def to_radians(degrees):
+    return np.ascontiguousarray(np.radians(np.asarray(degrees, dtype=np.float64)))
+
+def haversine_distances(origin_lat, origin_long, lats, longs, unit=MILES):
+    # All coordinates are in radians. A scalar origin gives one distance per
+    # point; an array of m origins gives an (m, n) matrix in the same pass.
+    radius = earth_radius(unit)
+    origin_lat = np.asarray(origin_lat, dtype=np.float64)
+    origin_long = np.asarray(origin_long, dtype=np.float64)
+    if origin_lat.ndim:
+        origin_lat = origin_lat[:, np.newaxis]
+        origin_long = origin_long[:, np.newaxis]
+    sin_dlat = np.sin((lats - origin_lat) * 0.5)
+    sin_dlong = np.sin((longs - origin_long) * 0.5)
+    a = sin_dlat * sin_dlat + np.cos(origin_lat) * np.cos(lats) * sin_dlong * sin_dlong
+    np.minimum(a, 1.0, out=a)
+    return 2 * radius * np.arcsin(np.sqrt(a))
+
+def haversine_matrix(origins, lats, longs, unit=MILES):
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    return haversine_distances(origins[:, 0], origins[:, 1], lats, longs, unit=unit)
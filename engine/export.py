@@ -0,0 +1,45 @@
+import csv
+import io
+
+EXPORT_CHUNK_SIZE = 5000
+
+def cursor_headers(cursor):
+    return [column[0] for column in cursor.description]
+
+def iter_cursor_chunks(cursor, size=EXPORT_CHUNK_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def write_csv(file, headers, chunks, on_chunk=None):
+    writer = csv.writer(file)
+    writer.writerow(headers)
+    file.flush()
+    total = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        total += len(rows)
+        if on_chunk is not None:
+            on_chunk(total)
+    return total
+
+def export_csv(filename, headers, chunks, on_chunk=None):
+    with open(filename, 'w', newline='', encoding='utf-8') as file:
+        return write_csv(file, headers, chunks, on_chunk)
+
+def export_query_csv(conn, query, filename, size=EXPORT_CHUNK_SIZE, on_chunk=None):
+    cursor = conn.execute(query)
+    return export_csv(filename, cursor_headers(cursor), iter_cursor_chunks(cursor, size), on_chunk)
+
+def iter_csv_text(headers, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
@@ -0,0 +1,189 @@
+import heapq
+import math
+import numpy as np
+from engine.distance import MILES, earth_radius
+
+LEAF_SIZE = 32
+
+def unit_vectors(lats, longs):
+    # Radians in, (n, 3) points on the unit sphere out. Straight-line
+    # distance between these points orders the same way as great-circle
+    # distance, so the tree can work in plain 3D.
+    lats = np.asarray(lats, dtype=np.float64)
+    longs = np.asarray(longs, dtype=np.float64)
+    cos_lats = np.cos(lats)
+    return np.ascontiguousarray(np.stack(
+        [cos_lats * np.cos(longs), cos_lats * np.sin(longs), np.sin(lats)], axis=-1))
+
+def chord_to_distance(chord, unit=MILES):
+    return 2 * earth_radius(unit) * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+class KDTree:
+    def __init__(self, lats, longs, leaf_size=LEAF_SIZE):
+        points = unit_vectors(lats, longs)
+        valid = np.flatnonzero(np.isfinite(points).all(axis=1))
+        self.size = len(points)
+        self.leaf_size = leaf_size
+        self.index = valid
+        self.points = points[valid]
+        # Nodes cover contiguous ranges of self.index, children after parents
+        self.starts = []
+        self.ends = []
+        self.children = []
+        self.parents = []
+        self.boxes = []
+        self._last_mask = None
+        if len(valid):
+            self._build()
+        self.points = np.ascontiguousarray(self.points)
+
+    def _build(self):
+        stack = [(0, len(self.index), None, 0)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(self.starts)
+            if parent is not None:
+                self.children[parent][side] = node
+            points = self.points[start:end]
+            low = points.min(axis=0)
+            high = points.max(axis=0)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.parents.append(parent)
+            self.boxes.append(tuple(low.tolist()) + tuple(high.tolist()))
+            if end - start <= self.leaf_size:
+                self.children.append(None)
+                continue
+            self.children.append([None, None])
+            axis = int(np.argmax(high - low))
+            middle = (end - start) // 2
+            order = np.argpartition(points[:, axis], middle)
+            self.points[start:end] = points[order]
+            self.index[start:end] = self.index[start:end][order]
+            stack.append((start + middle, end, node, 1))
+            stack.append((start, start + middle, node, 0))
+
+    def _tree_mask(self, mask):
+        # Callers reuse the same mask array across many queries, keep the
+        # tree-ordered copy and its prefix counts for the last one seen
+        cached = self._last_mask
+        if cached is not None and cached[0] is mask:
+            return cached[1], cached[2]
+        allowed = np.asarray(mask, dtype=bool)[self.index]
+        counts = np.concatenate([[0], np.cumsum(allowed)])
+        self._last_mask = (mask, allowed, counts)
+        return allowed, counts
+
+    def _box_distance(self, node, x, y, z):
+        min_x, min_y, min_z, max_x, max_y, max_z = self.boxes[node]
+        dx = min_x - x if x < min_x else (x - max_x if x > max_x else 0.0)
+        dy = min_y - y if y < min_y else (y - max_y if y > max_y else 0.0)
+        dz = min_z - z if z < min_z else (z - max_z if z > max_z else 0.0)
+        return dx * dx + dy * dy + dz * dz
+
+    def query(self, lat, long, k, mask=None):
+        # lat/long in radians. mask is a boolean array over the original rows;
+        # rows outside it are skipped while searching rather than afterwards,
+        # and subtrees with no matching rows are never visited.
+        if k <= 0 or not self.starts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        target = unit_vectors(lat, long)
+        x, y, z = target.tolist()
+        allowed = None
+        counts = None
+        if mask is not None:
+            allowed, counts = self._tree_mask(mask)
+        best_d2 = np.empty(0)
+        best_rows = np.empty(0, dtype=np.int64)
+        bound = math.inf
+        heap = [(0.0, 0)]
+        while heap:
+            d2, node = heapq.heappop(heap)
+            if d2 > bound:
+                break
+            start = self.starts[node]
+            end = self.ends[node]
+            if counts is not None and counts[end] == counts[start]:
+                continue
+            children = self.children[node]
+            if children is not None:
+                for child in children:
+                    child_d2 = self._box_distance(child, x, y, z)
+                    if child_d2 <= bound:
+                        heapq.heappush(heap, (child_d2, child))
+                continue
+            rows = np.arange(start, end)
+            if allowed is not None:
+                rows = rows[allowed[start:end]]
+            diff = self.points[rows] - target
+            dist2 = np.einsum('ij,ij->i', diff, diff)
+            best_d2 = np.concatenate([best_d2, dist2])
+            best_rows = np.concatenate([best_rows, rows])
+            if len(best_d2) > k:
+                top = np.argpartition(best_d2, k - 1)[:k]
+                best_d2 = best_d2[top]
+                best_rows = best_rows[top]
+            if len(best_d2) == k:
+                bound = best_d2.max()
+        order = np.lexsort((self.index[best_rows], best_d2))
+        return self.index[best_rows[order]], np.sqrt(best_d2[order])
+
+    def leaves(self):
+        return [node for node, children in enumerate(self.children) if children is None]
+
+    def _box_gap(self, node, box):
+        # Squared distance between a node's box and another box, 0 if they overlap
+        min_x, min_y, min_z, max_x, max_y, max_z = self.boxes[node]
+        other_min_x, other_min_y, other_min_z, other_max_x, other_max_y, other_max_z = box
+        dx = max(min_x - other_max_x, other_min_x - max_x, 0.0)
+        dy = max(min_y - other_max_y, other_min_y - max_y, 0.0)
+        dz = max(min_z - other_max_z, other_min_z - max_z, 0.0)
+        return dx * dx + dy * dy + dz * dz
+
+    def _positions_near(self, box, bound):
+        # Tree positions of every point in a leaf that comes within bound of box
+        ranges = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_gap(node, box) > bound:
+                continue
+            children = self.children[node]
+            if children is None:
+                ranges.append(np.arange(self.starts[node], self.ends[node]))
+            else:
+                stack.extend(children)
+        return np.concatenate(ranges)
+
+    def leaf_neighbors(self, leaf, k):
+        # The k nearest other points of every point in one leaf, computed
+        # for the whole leaf at once. Returns original rows, their neighbors'
+        # rows as (points, k) and chord lengths. Any k+1 points bound the
+        # answer, so the smallest ancestor holding that many gives a radius,
+        # and only leaves within it can hold a closer neighbor.
+        k = min(k, len(self.index) - 1)
+        start, end = self.starts[leaf], self.ends[leaf]
+        positions = np.arange(start, end)
+        if k <= 0:
+            return self.index[positions], np.empty((len(positions), 0), dtype=np.int64), np.empty((len(positions), 0))
+        points = self.points[start:end]
+        node = leaf
+        while self.ends[node] - self.starts[node] <= k:
+            node = self.parents[node]
+        first = self.points[self.starts[node]:self.ends[node]]
+        bound_d2 = (points[:, None, :] - first[None, :, :]) ** 2
+        bound = np.partition(bound_d2.sum(axis=2), k, axis=1)[:, k].max()
+        candidates = self._positions_near(self.boxes[leaf], bound)
+        diff = points[:, None, :] - self.points[candidates][None, :, :]
+        dist2 = np.einsum('ijk,ijk->ij', diff, diff)
+        dist2[candidates[None, :] == positions[:, None]] = np.inf
+        nearest = np.argpartition(dist2, k - 1, axis=1)[:, :k]
+        nearest_d2 = np.take_along_axis(dist2, nearest, axis=1)
+        order = np.argsort(nearest_d2, axis=1, kind='stable')
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_d2 = np.take_along_axis(nearest_d2, order, axis=1)
+        return self.index[positions], self.index[candidates[nearest]], np.sqrt(nearest_d2)
+
+    def memory_usage(self):
+        return (self.index.nbytes + self.points.nbytes
+                + len(self.starts) * (3 * 8 + 6 * 8 + 2 * 8))
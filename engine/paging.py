@@ -0,0 +1,66 @@
+import threading
+import pandas as pd
+from engine.connections import open_read_only
+
+PAGE_SIZE = 2000
+
+def count_query(query):
+    return f"SELECT COUNT(*) FROM (\n{query.strip().rstrip(';')}\n)"
+
+class PagedQuery:
+    # Keeps one cursor open across pages so each page continues the same
+    # statement instead of re-running it with a larger OFFSET
+    def __init__(self, db_path, query, page_size=PAGE_SIZE):
+        self.db_path = db_path
+        self.query = query
+        self.page_size = page_size
+        self.conn = None
+        self.cursor = None
+        self.headers = None
+        self.rows = 0
+        self.exhausted = False
+        self.loading = False
+        self._lock = threading.Lock()
+
+    def open(self):
+        # Its own connection, pages are fetched from whichever worker thread is free
+        conn = open_read_only(self.db_path)
+        with self._lock:
+            if self.exhausted:
+                # close() ran before there was a connection to close
+                conn.close()
+                return
+            self.conn = conn
+            self.cursor = conn.execute(self.query)
+            if self.cursor.description is None:
+                self.headers = []
+                self.exhausted = True
+            else:
+                self.headers = [column[0] for column in self.cursor.description]
+
+    def fetch_page(self):
+        with self._lock:
+            if self.cursor is None:
+                return pd.DataFrame(columns=self.headers)
+            rows = self.cursor.fetchmany(self.page_size)
+            self.rows += len(rows)
+            if len(rows) < self.page_size:
+                self.exhausted = True
+                self._close()
+            return pd.DataFrame.from_records(rows, columns=self.headers)
+
+    def can_fetch_more(self):
+        return not self.exhausted and not self.loading and self.conn is not None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.interrupt()
+        with self._lock:
+            self.exhausted = True
+            self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+        self.cursor = None
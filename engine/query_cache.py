@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_MB = 256
+CACHE_SIZE_ENV = "CURLY_QUERY_CACHE_MB"
+READ_ONLY_KEYWORDS = ("select", "with", "values")
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ,
+                   sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+VOLATILE_FUNCTIONS = {"random", "randomblob", "changes", "total_changes",
+                      "last_insert_rowid", "date", "time", "datetime",
+                      "julianday", "strftime", "unixepoch", "timediff"}
+VOLATILE_KEYWORDS = ("current_date", "current_time", "current_timestamp")
+SQL_KEYWORDS = {"select", "distinct", "all", "from", "where", "and", "or", "not",
+                "in", "is", "null", "like", "glob", "between", "group", "by",
+                "having", "order", "asc", "desc", "limit", "offset", "as", "join",
+                "inner", "left", "outer", "cross", "on", "using", "union",
+                "intersect", "except", "with", "recursive", "values", "case",
+                "when", "then", "else", "end", "cast", "exists", "collate"}
+
+def normalize_sql(sql):
+    # Collapse whitespace, drop comments and lowercase keywords outside of
+    # quoted literals and identifiers, so reformatting a query still hits the
+    # same entry
+    parts = []
+    idx = 0
+    length = len(sql)
+    pending_space = False
+    while idx < length:
+        char = sql[idx]
+        if char in "'\"`[":
+            close = "]" if char == "[" else char
+            end = idx + 1
+            while end < length:
+                if sql[end] == close:
+                    if close != "]" and end + 1 < length and sql[end + 1] == close:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            token = sql[idx:end + 1]
+            idx = end + 1
+        elif sql.startswith("--", idx):
+            end = sql.find("\n", idx)
+            idx = length if end == -1 else end
+            pending_space = True
+            continue
+        elif sql.startswith("/*", idx):
+            end = sql.find("*/", idx + 2)
+            idx = length if end == -1 else end + 2
+            pending_space = True
+            continue
+        elif char.isspace():
+            pending_space = True
+            idx += 1
+            continue
+        elif char.isalpha() or char == "_":
+            end = idx + 1
+            while end < length and (sql[end].isalnum() or sql[end] == "_"):
+                end += 1
+            token = sql[idx:end]
+            if token.lower() in SQL_KEYWORDS:
+                token = token.lower()
+            idx = end
+        else:
+            token = char
+            idx += 1
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+        parts.append(token)
+    return "".join(parts).rstrip("; ")
+
+def is_cacheable(normalized_sql):
+    lowered = normalized_sql.lower()
+    if not lowered.startswith(READ_ONLY_KEYWORDS):
+        return False
+    return not any(keyword in lowered for keyword in VOLATILE_KEYWORDS)
+
+def database_version(db_path, conn=None):
+    stat = os.stat(db_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if conn is not None:
+        # data_version only changes between calls on the same connection, so
+        # it is only meaningful for connections that stay open
+        version += (conn.execute("PRAGMA data_version").fetchone()[0],)
+    return version
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class ReadOnlyGuard:
+    def __init__(self):
+        self.read_only = True
+
+    def __call__(self, action, arg1, arg2, db_name, trigger):
+        if action not in ALLOWED_ACTIONS:
+            self.read_only = False
+        elif action == sqlite3.SQLITE_FUNCTION and arg2 and arg2.lower() in VOLATILE_FUNCTIONS:
+            self.read_only = False
+        return sqlite3.SQLITE_OK
+
+class QueryCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, version, df, size=None):
+        if size is None:
+            size = frame_size(df)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (version, df, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+        return True
+
+    def _discard(self, key):
+        self.size -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_query_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_MB))
+            _cache = QueryCache(int(max_mb * 1024 * 1024))
+        return _cache
@@ -0,0 +1,31 @@
+import re
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+def explain_query(conn, query):
+    cursor = conn.execute(f"EXPLAIN QUERY PLAN {query.strip().rstrip(';')}")
+    return [(row[0], row[1], row[3]) for row in cursor.fetchall()]
+
+def format_query_plan(plan):
+    # Same tree layout the sqlite3 shell uses for .eqp
+    children = {}
+    for node_id, parent, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+    lines = ["QUERY PLAN"]
+
+    def add_lines(parent, prefix):
+        nodes = children.get(parent, [])
+        for i, (node_id, detail) in enumerate(nodes):
+            last = i == len(nodes) - 1
+            lines.append(f"{prefix}{'`--' if last else '|--'}{detail}")
+            add_lines(node_id, prefix + ("   " if last else "|  "))
+    add_lines(0, "")
+    return "\n".join(lines)
+
+def full_scans(plan):
+    scans = []
+    for _, _, detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) != "CONSTANT":
+            scans.append(match.group(1))
+    return scans
@@ -0,0 +1,17 @@
+FIND_SCHOOLS_COLUMNS = """
+    school_name,
+    education_agency_name,
+    location_address_street_1,
+    location_address_street_2,
+    location_city,
+    location_state,
+    location_5_digit_zip_code as location_zip,
+    county_name,
+    grades_offered_lowest,
+    grades_offered_highest,
+    total_of_free_lunch_and_reducedprice_lunch_eligible,
+    total_students_all_grades_includes_ae as total_students,
+    total_elementarysecondary_students_excludes_ae as total_elementary,
+    latitude,
+    longitude
+"""
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_TABLE = "school_data_snapshot"
+MANIFEST_FILE = "manifest.json"
+
+def snapshot_path(db_path):
+    return os.path.splitext(db_path)[0] + ".snapshot"
+
+class TextColumn:
+    # UTF-8 strings stored back to back in one blob, row i is
+    # blob[offsets[i]:offsets[i + 1]], decoded only when rows are taken
+    def __init__(self, offsets, blob, nulls=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.blob.nbytes + (self.nulls.nbytes if self.nulls is not None else 0)
+
+    def take(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        blob = self.blob
+        values = np.empty(len(rows), dtype=object)
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            values[i] = blob[start:end].tobytes().decode('utf-8')
+        if self.nulls is not None:
+            values[self.nulls[rows]] = None
+        return values
+
+    def to_numpy(self):
+        return self.take(np.arange(len(self)))
+
+def column_kind(values):
+    kinds = {type(value) for value in values if value is not None}
+    if kinds <= {int} and None not in values:
+        return "int64"
+    if kinds <= {int, float}:
+        return "float64"
+    return "text"
+
+def encode_text(values):
+    encoded = [b"" if value is None else str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    nulls = np.array([value is None for value in values], dtype=bool)
+    return {"offsets": offsets, "blob": blob, "nulls": nulls if nulls.any() else None}
+
+def encode_column(values):
+    kind = column_kind(values)
+    if kind == "text":
+        return kind, encode_text(values)
+    if kind == "int64":
+        return kind, {"data": np.array(values, dtype=np.int64)}
+    return kind, {"data": np.array([np.nan if value is None else value for value in values], dtype=np.float64)}
+
+def array_digest(array):
+    return hashlib.sha256(np.ascontiguousarray(array).data).hexdigest()
+
+def table_checksum(columns):
+    digest = hashlib.sha256()
+    for column in columns:
+        digest.update(column["name"].encode('utf-8'))
+        for part in sorted(column["files"]):
+            digest.update(column["files"][part]["sha256"].encode('ascii'))
+    return digest.hexdigest()
+
+def read_columns(conn, query):
+    cursor = conn.execute(query)
+    names = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    values = list(zip(*rows)) if rows else [() for _ in names]
+    return names, values, len(rows)
+
+def write_snapshot(db_path, query, snapshot_dir=None, table_name="school_data"):
+    snapshot_dir = snapshot_dir or snapshot_path(db_path)
+    temp_dir = f"{snapshot_dir}.tmp"
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+    conn = sqlite3.connect(db_path)
+    try:
+        names, values, row_count = read_columns(conn, f"{query} ORDER BY rowid")
+        columns = []
+        for i, (name, column_values) in enumerate(zip(names, values)):
+            kind, arrays = encode_column(list(column_values))
+            files = {}
+            for part, array in arrays.items():
+                if array is None:
+                    continue
+                filename = f"{i:03d}_{part}.npy"
+                np.save(os.path.join(temp_dir, filename), array, allow_pickle=False)
+                files[part] = {"file": filename, "sha256": array_digest(array)}
+            columns.append({"name": name, "kind": kind, "files": files})
+        manifest = {"format": SNAPSHOT_FORMAT, "table": table_name, "rows": row_count,
+                    "columns": columns, "checksum": table_checksum(columns)}
+        with open(os.path.join(temp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+        os.replace(temp_dir, snapshot_dir)
+        # Record what the snapshot was built from, so readers can tell when
+        # the table has changed underneath it
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (checksum TEXT, rows INTEGER, created_at TEXT)")
+            conn.execute(f"DELETE FROM {SNAPSHOT_TABLE}")
+            conn.execute(f"INSERT INTO {SNAPSHOT_TABLE} VALUES (?, ?, datetime('now'))",
+                         (manifest["checksum"], row_count))
+    finally:
+        conn.close()
+    return manifest
+
+def invalidate_snapshot(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {SNAPSHOT_TABLE}")
+
+def read_manifest(snapshot_dir):
+    manifest_file = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def snapshot_status(conn, manifest, table_name="school_data"):
+    if manifest is None:
+        return "no snapshot"
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        return "snapshot format changed"
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SNAPSHOT_TABLE,)).fetchone()
+    if not exists:
+        return "table changed since the snapshot was written"
+    marker = conn.execute(f"SELECT checksum, rows FROM {SNAPSHOT_TABLE}").fetchone()
+    if marker is None or marker[0] != manifest["checksum"]:
+        return "snapshot checksum does not match the database"
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    if rows != manifest["rows"] or marker[1] != rows:
+        return f"snapshot has {manifest['rows']:,} rows, table has {rows:,}"
+    return None
+
+def is_mapped(array):
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+def map_column(snapshot_dir, column):
+    # Plain ndarray views over the mapping, np.memmap adds overhead to every slice
+    arrays = {part: np.load(os.path.join(snapshot_dir, info["file"]), mmap_mode='r',
+                            allow_pickle=False).view(np.ndarray)
+              for part, info in column["files"].items()}
+    if column["kind"] == "text":
+        return TextColumn(arrays["offsets"], arrays["blob"], arrays.get("nulls"))
+    return arrays["data"]
+
+def load_snapshot(snapshot_dir, conn, table_name="school_data"):
+    manifest = read_manifest(snapshot_dir)
+    reason = snapshot_status(conn, manifest, table_name)
+    if reason:
+        return None, reason
+    columns = {column["name"]: map_column(snapshot_dir, column) for column in manifest["columns"]}
+    return columns, None
+
+def verify_snapshot(snapshot_dir, db_path, query):
+    # Full check: every mapped file against the manifest and the manifest
+    # against a fresh read of the table
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return ["no snapshot"]
+    problems = []
+    for column in manifest["columns"]:
+        for part, info in column["files"].items():
+            array = np.load(os.path.join(snapshot_dir, info["file"]), mmap_mode='r', allow_pickle=False)
+            if array_digest(array) != info["sha256"]:
+                problems.append(f"{info['file']} does not match its checksum")
+    conn = sqlite3.connect(db_path)
+    try:
+        reason = snapshot_status(conn, manifest, manifest["table"])
+        if reason:
+            problems.append(reason)
+        names, values, row_count = read_columns(conn, f"{query} ORDER BY rowid")
+    finally:
+        conn.close()
+    expected = []
+    for name, column_values in zip(names, values):
+        kind, arrays = encode_column(list(column_values))
+        expected.append({"name": name, "kind": kind, "files": {
+            part: {"sha256": array_digest(array)} for part, array in arrays.items() if array is not None}})
+    if row_count != manifest["rows"]:
+        problems.append(f"snapshot has {manifest['rows']:,} rows, table has {row_count:,}")
+    if table_checksum(expected) != manifest["checksum"]:
+        problems.append("table contents do not match the snapshot checksum")
+    return problems
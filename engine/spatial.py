@@ -0,0 +1,58 @@
+import math
+import numpy as np
+from engine.distance import MILES, earth_radius
+
+EARTH_RADIUS_MILES = earth_radius(MILES)
+
+def bounding_boxes(lat, long, max_distance):
+    angular = max_distance / EARTH_RADIUS_MILES
+    if angular >= math.pi:
+        return [(-90.0, 90.0, -180.0, 180.0)]
+    delta = math.degrees(angular)
+    min_lat = lat - delta
+    max_lat = lat + delta
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    delta_long = math.degrees(math.asin(ratio))
+    min_long = long - delta_long
+    max_long = long + delta_long
+    if min_long < -180:
+        return [(min_lat, max_lat, min_long + 360, 180.0),
+                (min_lat, max_lat, -180.0, max_long)]
+    if max_long > 180:
+        return [(min_lat, max_lat, min_long, 180.0),
+                (min_lat, max_lat, -180.0, max_long - 360)]
+    return [(min_lat, max_lat, min_long, max_long)]
+
+class GridIndex:
+    def __init__(self, lats, longs, cell_size=0.25):
+        self.cell_size = cell_size
+        self.columns = int(math.ceil(360 / cell_size)) + 1
+        lat_cells = np.floor((np.asarray(lats, dtype=np.float64) + 90) / cell_size)
+        long_cells = np.floor((np.asarray(longs, dtype=np.float64) + 180) / cell_size)
+        keys = lat_cells.astype(np.int64) * self.columns + long_cells.astype(np.int64)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def _cell(self, value, offset):
+        return int(math.floor((value + offset) / self.cell_size))
+
+    def candidates(self, boxes):
+        starts = []
+        ends = []
+        for min_lat, max_lat, min_long, max_long in boxes:
+            lat_cells = np.arange(self._cell(min_lat, 90), self._cell(max_lat, 90) + 1, dtype=np.int64)
+            first = lat_cells * self.columns + self._cell(min_long, 180)
+            last = lat_cells * self.columns + self._cell(max_long, 180)
+            starts.append(np.searchsorted(self.keys, first, side='left'))
+            ends.append(np.searchsorted(self.keys, last, side='right'))
+        ranges = [(s, e) for s, e in zip(np.concatenate(starts), np.concatenate(ends)) if e > s]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[s:e] for s, e in ranges])
+
+    def memory_usage(self):
+        return self.order.nbytes + self.keys.nbytes
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import time
+
+PROFILE_FLAG = "--profile-startup"
+TRACE_LOG_FLAG = "--trace-log"
+TRACE_MEMORY_FLAG = "--trace-memory"
+
+def extraction_seconds(started_at):
+    # A --onefile build unpacks itself into a fresh _MEI directory before
+    # Python starts, so the directory's age when main.py starts is the time
+    # spent extracting and booting the interpreter
+    bundle_dir = getattr(sys, '_MEIPASS', None)
+    if bundle_dir is None or not os.path.basename(bundle_dir).startswith('_MEI'):
+        return None
+    stat = os.stat(bundle_dir)
+    created = getattr(stat, 'st_birthtime', stat.st_ctime)
+    return max(started_at - created, 0.0)
+
+class StartupProfile:
+    def __init__(self, argv, started_at, started_clock):
+        self.enabled = PROFILE_FLAG in argv
+        self.stages = []
+        self.last = started_clock
+        extraction = extraction_seconds(started_at)
+        if extraction is not None:
+            self.stages.append(("extraction", extraction))
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def total(self):
+        return sum(seconds for _, seconds in self.stages)
+
+    def report(self):
+        lines = ["Startup profile"]
+        for stage, seconds in self.stages:
+            lines.append(f"  {stage:<12} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<12} {self.total() * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+def parse_app_flags(argv):
+    # The app's own flags, and the remaining arguments to hand to Qt
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(PROFILE_FLAG, action="store_true")
+    parser.add_argument(TRACE_LOG_FLAG, metavar="PATH")
+    parser.add_argument(TRACE_MEMORY_FLAG, action="store_true")
+    flags, rest = parser.parse_known_args(argv[1:])
+    return flags, argv[:1] + rest
@@ -0,0 +1,241 @@
+import math
+import os
+import threading
+from functools import cached_property
+import numpy as np
+import pandas as pd
+from engine.connections import get_connection_manager
+from engine.distance import MILES, haversine_distances, to_radians
+from engine.kdtree import KDTree
+from engine.search import FIND_SCHOOLS_COLUMNS
+from engine.snapshot import (TextColumn, is_mapped, load_snapshot, snapshot_path, verify_snapshot,
+                             write_snapshot)
+from engine.spatial import GridIndex, bounding_boxes
+from engine.trace import traced_stage
+
+# Columns loaded for filtering only, they are not part of the results
+FILTER_COLUMNS = ["school_type_description"]
+STORE_QUERY = f"SELECT {FIND_SCHOOLS_COLUMNS}, {', '.join(FILTER_COLUMNS)} FROM school_data"
+GRADE_LEVELS = {"PK": "-1", "KG": "0"}
+MASK_CACHE_SIZE = 32
+
+def grade_levels(values):
+    # PK < KG < 1 .. 13, anything else (UG, AE, N, M) has no level
+    text = pd.Series(values).astype(str).str.strip().str.upper().replace(GRADE_LEVELS)
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64)
+
+def column_values(column):
+    return column.to_numpy() if isinstance(column, TextColumn) else np.asarray(column)
+
+def take_rows(column, rows):
+    return column.take(rows) if isinstance(column, TextColumn) else np.asarray(column[rows])
+
+def resident_bytes(array):
+    # Mapped snapshot pages belong to the page cache, not to this process
+    if isinstance(array, TextColumn):
+        return sum(resident_bytes(part) for part in (array.offsets, array.blob, array.nulls) if part is not None)
+    if is_mapped(array):
+        return 0
+    if getattr(array, 'dtype', None) == object:
+        return int(pd.Series(array).memory_usage(index=False, deep=True))
+    return array.nbytes
+
+def result_frame(columns):
+    with traced_stage("convert") as stage:
+        frame = pd.DataFrame(columns)
+        stage.add(rows=len(frame))
+        return frame
+
+class SchoolData:
+    # columns maps each name to a NumPy array or a TextColumn; either may be
+    # memory mapped from a snapshot, so whole-column work is deferred until
+    # a filter needs it
+    def __init__(self, columns, version, source="database"):
+        self.columns = columns
+        self.result_columns = [name for name in columns if name not in FILTER_COLUMNS]
+        self.version = version
+        self.source = source
+        self.size = len(columns['latitude'])
+        self.latitudes = to_radians(columns['latitude'])
+        self.longitudes = to_radians(columns['longitude'])
+        self.grid = GridIndex(columns['latitude'], columns['longitude'])
+        self._kdtree = None
+        self._kdtree_lock = threading.Lock()
+        self._masks = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        # Lets worker processes receive the data, locks do not pickle
+        state = self.__dict__.copy()
+        del state['_kdtree_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._kdtree_lock = threading.Lock()
+
+    @property
+    def kdtree(self):
+        with self._kdtree_lock:
+            if self._kdtree is None:
+                self._kdtree = KDTree(self.latitudes, self.longitudes)
+            return self._kdtree
+
+    @cached_property
+    def school_types(self):
+        return pd.Categorical(column_values(self.columns['school_type_description']))
+
+    @cached_property
+    def states(self):
+        return pd.Series(column_values(self.columns['location_state'])).astype(str).str.upper().to_numpy()
+
+    @cached_property
+    def grade_lows(self):
+        return grade_levels(column_values(self.columns['grades_offered_lowest']))
+
+    @cached_property
+    def grade_highs(self):
+        return grade_levels(column_values(self.columns['grades_offered_highest']))
+
+    def memory_usage(self):
+        usage = (sum(resident_bytes(column) for column in self.columns.values())
+                 + self.latitudes.nbytes + self.longitudes.nbytes
+                 + self.grid.memory_usage())
+        for name in ['school_types', 'states', 'grade_lows', 'grade_highs']:
+            if name in self.__dict__:
+                usage += resident_bytes(self.__dict__[name]) if name == 'states' else self.__dict__[name].nbytes
+        if self._kdtree is not None:
+            usage += self._kdtree.memory_usage()
+        return int(usage)
+
+    def filter_mask(self, state=None, school_type=None, grades=None):
+        key = (state and state.strip().upper(), school_type, grades)
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.clear()
+            mask = self._masks[key] = self._build_mask(state, school_type, grades)
+        return mask
+
+    def _build_mask(self, state, school_type, grades):
+        mask = np.ones(self.size, dtype=bool)
+        if state:
+            mask &= self.states == state.strip().upper()
+        if school_type:
+            mask &= np.asarray(self.school_types == school_type)
+        if grades:
+            low, high = grades
+            if high is not None:
+                mask &= self.grade_lows <= high
+            if low is not None:
+                mask &= self.grade_highs >= low
+        return mask
+
+    def _result_columns(self, rows, distances):
+        with traced_stage("results", rows=len(rows)):
+            order = np.lexsort((rows, distances))
+            rows = rows[order]
+            columns = {name: take_rows(self.columns[name], rows) for name in self.result_columns}
+            columns['distance'] = distances[order].round(2)
+            return columns
+
+    def _distances(self, lat, long, rows):
+        with traced_stage("haversine", rows=len(rows)):
+            return haversine_distances(
+                math.radians(lat), math.radians(long),
+                self.latitudes[rows], self.longitudes[rows],
+                unit=MILES)
+
+    def nearby_columns(self, lat, long, max_distance, **filters):
+        # Result columns as arrays, for callers that serialize them directly
+        # and do not need a DataFrame
+        with traced_stage("candidates") as stage:
+            rows = self.grid.candidates(bounding_boxes(lat, long, max_distance))
+            if any(filters.values()):
+                rows = rows[self.filter_mask(**filters)[rows]]
+            stage.add(rows=len(rows))
+        distances = self._distances(lat, long, rows)
+        keep = distances <= max_distance
+        return self._result_columns(rows[keep], distances[keep])
+
+    def nearest_columns(self, lat, long, k, **filters):
+        with traced_stage("candidates") as stage:
+            mask = self.filter_mask(**filters) if any(filters.values()) else None
+            rows, _ = self.kdtree.query(math.radians(lat), math.radians(long), k, mask=mask)
+            stage.add(rows=len(rows))
+        return self._result_columns(rows, self._distances(lat, long, rows))
+
+    def find_nearby(self, lat, long, max_distance, **filters):
+        return result_frame(self.nearby_columns(lat, long, max_distance, **filters))
+
+    def find_nearest(self, lat, long, k, **filters):
+        return result_frame(self.nearest_columns(lat, long, k, **filters))
+
+class SchoolStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _version(self, conn):
+        # The stat catches rewrites, schema_version catches DDL that lands
+        # within one mtime tick and leaves the size alone
+        stat = os.stat(self.db_path)
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        return (stat.st_mtime_ns, stat.st_size, schema_version)
+
+    def _load(self, conn, version, quiet=False):
+        columns, reason = load_snapshot(snapshot_path(self.db_path), conn)
+        source = "snapshot"
+        if columns is None:
+            if not quiet:
+                print(f"School store reading the database ({reason})")
+            frame = pd.read_sql_query(STORE_QUERY, conn)
+            columns = {name: frame[name].to_numpy() for name in frame.columns}
+            source = "database"
+        data = SchoolData(columns, version, source)
+        if not quiet:
+            print(f"School store loaded {len(data):,} schools from the {source} "
+                  f"({data.memory_usage() / 1024 ** 2:.1f} MB resident)")
+        return data
+
+    def get(self, quiet=False):
+        conn = get_connection_manager(self.db_path).connection()
+        version = self._version(conn)
+        data = self._data
+        if data is not None and data.version == version:
+            return data
+        with self._lock:
+            if self._data is None or self._data.version != version:
+                with traced_stage("store load") as stage:
+                    self._data = self._load(conn, version, quiet)
+                    stage.add(rows=len(self._data))
+            return self._data
+
+    def find_nearby(self, lat, long, max_distance, **filters):
+        return self.get().find_nearby(lat, long, max_distance, **filters)
+
+    def nearby_columns(self, lat, long, max_distance, **filters):
+        return self.get().nearby_columns(lat, long, max_distance, **filters)
+
+    def find_nearest(self, lat, long, k, **filters):
+        return self.get().find_nearest(lat, long, k, **filters)
+
+def write_store_snapshot(db_path):
+    return write_snapshot(db_path, STORE_QUERY, snapshot_path(db_path))
+
+def verify_store_snapshot(db_path):
+    return verify_snapshot(snapshot_path(db_path), db_path, STORE_QUERY)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_school_store(db_path):
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SchoolStore(key)
+        return store
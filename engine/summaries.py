@@ -0,0 +1,61 @@
+SOURCE_TABLE = "school_data"
+TYPE_COLUMN = "school_type_description"
+# Grain name, the summary table's suffix and the columns it groups by,
+# every table is also split by school type
+SUMMARY_GRAINS = {
+    "State": ("by_state", ["location_state"]),
+    "County": ("by_county", ["location_state", "county_name"]),
+    "ZIP": ("by_zip", ["location_state", "location_5_digit_zip_code"]),
+}
+# Summed measures and the school_data column each one adds up
+MEASURES = {
+    "total_students": "total_students_all_grades_includes_ae",
+    "free_reduced_lunch": "total_of_free_lunch_and_reducedprice_lunch_eligible",
+    "free_lunch": "free_lunch_program",
+    "reduced_lunch": "reducedlunch_program",
+    "total_teachers": "total_teachers",
+}
+
+def summary_table(grain, table_name=SOURCE_TABLE):
+    return f"{table_name}_{SUMMARY_GRAINS[grain][0]}"
+
+def summary_columns():
+    # Columns a summary needs from the source table
+    columns = {TYPE_COLUMN, *MEASURES.values()}
+    for _, keys in SUMMARY_GRAINS.values():
+        columns.update(keys)
+    return columns
+
+def summary_select(table_name, keys):
+    # NCES marks missing and suppressed counts with negative codes, they
+    # count as nothing rather than taking from the total
+    group = ", ".join(f'"{column}"' for column in keys + [TYPE_COLUMN])
+    measures = ", ".join(f'SUM(MAX("{column}", 0)) AS {name}' for name, column in MEASURES.items())
+    return (f'SELECT {group}, COUNT(*) AS schools, {measures} '
+            f'FROM "{table_name}" GROUP BY {group}')
+
+def has_summaries(conn, table_name=SOURCE_TABLE):
+    names = [summary_table(grain, table_name) for grain in SUMMARY_GRAINS]
+    placeholders = ", ".join("?" for _ in names)
+    found = conn.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                         names).fetchone()[0]
+    return found == len(names)
+
+def rollup_query(grain, state=None, by_type=False):
+    # Reads the grain's summary table, adding up the school type rows unless
+    # they are asked for
+    keys = SUMMARY_GRAINS[grain][1] + ([TYPE_COLUMN] if by_type else [])
+    group = ", ".join(keys)
+    # Teachers are full-time equivalents, the only fractional measure
+    measures = ", ".join(f"ROUND(SUM({name}), 1) AS {name}" if name == "total_teachers" else f"SUM({name}) AS {name}"
+                         for name in MEASURES)
+    query = (f"SELECT {group}, SUM(schools) AS schools, {measures}, "
+             f"ROUND(100.0 * SUM(free_reduced_lunch) / NULLIF(SUM(total_students), 0), 1) "
+             f"AS free_reduced_lunch_pct "
+             f"FROM {summary_table(grain)}")
+    params = []
+    if state:
+        query += " WHERE location_state = ?"
+        params.append(state.upper())
+    query += f" GROUP BY {group} ORDER BY {group}"
+    return query, params
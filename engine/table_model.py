@@ -0,0 +1,153 @@
+from bisect import bisect_right
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# Looking up Qt enum members costs microseconds per access in PySide6, and
+# data() is called for every role of every visible cell
+DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+HORIZONTAL = Qt.Orientation.Horizontal
+
+def frame_columns(df):
+    return [df.iloc[:, col_idx].to_numpy() for col_idx in range(len(df.columns))]
+
+def export_values(array):
+    values = array.tolist()
+    for idx in np.flatnonzero(pd.isna(array)):
+        values[idx] = None
+    return values
+
+class ColumnTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = []
+        self._chunks = []
+        self._offsets = []
+        self._row_count = 0
+        self._order = None
+        self.fetcher = None
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self._headers = [str(column) for column in df.columns]
+        self._chunks = [frame_columns(df)] if len(df) else []
+        self._offsets = [0] if len(df) else []
+        self._row_count = len(df)
+        self._order = None
+        self.endResetModel()
+
+    def append_frame(self, df):
+        if not self._headers:
+            self.beginResetModel()
+            self._headers = [str(column) for column in df.columns]
+            self.endResetModel()
+        if not len(df):
+            return
+        first = self._row_count
+        last = first + len(df) - 1
+        self.beginInsertRows(QModelIndex(), first, last)
+        self._chunks.append(frame_columns(df))
+        self._offsets.append(first)
+        self._row_count = last + 1
+        if self._order is not None:
+            self._order = np.concatenate([self._order, np.arange(first, last + 1)])
+        self.endInsertRows()
+
+    def clear(self):
+        self.set_frame(pd.DataFrame())
+
+    def headers(self):
+        return list(self._headers)
+
+    def column(self, col_idx):
+        if not self._chunks:
+            return np.empty(0, dtype=object)
+        if len(self._chunks) > 1:
+            # Merge the incremental chunks once the column is needed whole
+            merged = [np.concatenate([chunk[idx] for chunk in self._chunks])
+                      for idx in range(len(self._headers))]
+            self._chunks = [merged]
+            self._offsets = [0]
+        return self._chunks[0][col_idx]
+
+    def row_chunks(self, size):
+        # Capture the current arrays so the rows can be read from a worker
+        # thread while the view keeps sorting or reloading the model
+        columns = [self.column(col_idx) for col_idx in range(len(self._headers))]
+        order = self._order
+        row_count = self._row_count
+
+        def chunks():
+            for start in range(0, row_count, size):
+                if order is None:
+                    rows = slice(start, min(start + size, row_count))
+                else:
+                    rows = order[start:start + size]
+                values = [export_values(column[rows]) for column in columns]
+                yield list(zip(*values))
+        return chunks()
+
+    def frame(self):
+        df = pd.DataFrame({idx: self.column(idx) for idx in range(len(self._headers))})
+        df.columns = self._headers
+        if self._order is not None:
+            df = df.iloc[self._order].reset_index(drop=True)
+        return df
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.fetcher is None:
+            return False
+        return self.fetcher.can_fetch_more()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid() and self.fetcher is not None:
+            self.fetcher.fetch_more()
+
+    def data(self, index, role=DISPLAY_ROLE):
+        if role != DISPLAY_ROLE or not index.isValid():
+            return None
+        row = index.row()
+        if self._order is not None:
+            row = self._order[row]
+        chunk_idx = bisect_right(self._offsets, row) - 1
+        value = self._chunks[chunk_idx][index.column()][row - self._offsets[chunk_idx]]
+        if value is None or value is pd.NA or value != value:
+            return ""
+        return str(value)
+
+    def headerData(self, section, orientation, role=DISPLAY_ROLE):
+        if role != DISPLAY_ROLE:
+            return None
+        if orientation == HORIZONTAL:
+            if section < len(self._headers):
+                return self._headers[section]
+            return None
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0 or column >= len(self._headers):
+            if self._order is not None:
+                self.layoutAboutToBeChanged.emit()
+                self._order = None
+                self.layoutChanged.emit()
+            return
+        self.layoutAboutToBeChanged.emit()
+        ascending = order == Qt.AscendingOrder
+        keys = pd.Series(self.column(column), copy=False)
+        try:
+            ordered = keys.sort_values(ascending=ascending, kind='stable', na_position='last')
+        except TypeError:
+            # SQLite columns can mix types, fall back to comparing text
+            ordered = keys.astype(str).sort_values(ascending=ascending, kind='stable')
+        self._order = ordered.index.to_numpy()
+        self.layoutChanged.emit()
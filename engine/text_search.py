@@ -0,0 +1,58 @@
+import re
+
+TEXT_INDEX_TABLE = "school_data_fts"
+TEXT_SEARCH_COLUMNS = ["school_name", "education_agency_name", "location_city", "county_name"]
+# bm25 weight per column above, a match in the school's own name counts most
+COLUMN_WEIGHTS = [10.0, 2.0, 4.0, 1.0]
+# Prefix indexes for the lengths people have typed when the first results show
+PREFIX_LENGTHS = "2 3"
+TOKENIZER = "unicode61 remove_diacritics 2"
+MIN_SEARCH_LENGTH = 2
+SEARCH_LIMIT = 50
+# bm25 costs more than the match itself, a word in most school names would
+# rank the whole table on every keystroke. Past this many matches only the
+# first ones are ranked, the text is too broad to rank usefully anyway
+RANK_LIMIT = 2000
+MAX_ROWID = 2 ** 63 - 1
+# Letters and digits, the characters unicode61 keeps in a token
+TOKEN = re.compile(r"[^\W_]+")
+
+SEARCH_RESULT_COLUMNS = ["school_name", "education_agency_name", "location_city",
+                         "location_state", "latitude", "longitude"]
+
+TEXT_SEARCH_QUERY = f"""
+    SELECT {', '.join(f's.{column}' for column in SEARCH_RESULT_COLUMNS)}
+    FROM (
+        SELECT rowid, bm25({TEXT_INDEX_TABLE}, {', '.join(map(str, COLUMN_WEIGHTS))}) AS score
+        FROM {TEXT_INDEX_TABLE}
+        WHERE {TEXT_INDEX_TABLE} MATCH ? AND rowid <= ?
+        ORDER BY score
+        LIMIT ?
+    ) m
+    JOIN school_data s ON s.rowid = m.rowid
+    ORDER BY m.score, s.school_name
+    """
+RANK_BOUND_QUERY = f"SELECT rowid FROM {TEXT_INDEX_TABLE} WHERE {TEXT_INDEX_TABLE} MATCH ? LIMIT 1 OFFSET ?"
+
+def has_text_index(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (TEXT_INDEX_TABLE,)).fetchone()
+    return row is not None
+
+def match_expression(text):
+    # Every word as a quoted prefix, so FTS5 syntax typed by the user is
+    # searched for as text and a half typed word still matches
+    tokens = TOKEN.findall(text)
+    if not tokens or len("".join(tokens)) < MIN_SEARCH_LENGTH:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def search_school_text(conn, text, limit=SEARCH_LIMIT):
+    # Ranked matches, and whether there were too many to rank them all
+    expression = match_expression(text)
+    if expression is None:
+        return [], False
+    bound = conn.execute(RANK_BOUND_QUERY, (expression, RANK_LIMIT)).fetchone()
+    rows = conn.execute(TEXT_SEARCH_QUERY, (expression, bound[0] if bound else MAX_ROWID, limit)).fetchall()
+    return rows, bound is not None
@@ -0,0 +1,198 @@
+import json
+import os
+import platform
+import sqlite3
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+TRACE_LOG_ENV = "CURLY_TRACE_LOG"
+TRACE_MEMORY_ENV = "CURLY_TRACE_MEMORY"
+SESSION_ID = uuid.uuid4().hex[:12]
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.rows = None
+        self.bytes = None
+        self.peak_bytes = None
+
+    def add(self, rows=None, size=None):
+        if rows is not None:
+            self.rows = (self.rows or 0) + rows
+        if size is not None:
+            self.bytes = (self.bytes or 0) + size
+
+    def record(self):
+        return {"name": self.name, "ms": round(self.seconds * 1000, 3), "calls": self.calls,
+                "rows": self.rows, "bytes": self.bytes, "peak_bytes": self.peak_bytes}
+
+class StageCall:
+    # What a running stage hands back, so the code inside can report rows
+    # and bytes as it learns them
+    def __init__(self, stage):
+        self.stage = stage
+        self.child_seconds = 0.0
+        self.start_memory = 0
+        self.peak_seen = 0
+
+    def add(self, rows=None, size=None):
+        self.stage.add(rows, size)
+
+class NullCall:
+    def add(self, rows=None, size=None):
+        pass
+
+class Trace:
+    # Wall time, rows, bytes and peak traced memory per named stage of one
+    # operation. Stages run on the worker thread and the UI thread; times are
+    # exclusive, a nested stage's time is not counted again in its parent
+    def __init__(self, operation):
+        self.operation = operation
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.status = None
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stage(self, name):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(name)
+            return stage
+
+    @contextmanager
+    def stage(self, name, rows=None, size=None):
+        stack = self._local.__dict__.setdefault('stack', [])
+        call = StageCall(self._stage(name))
+        call.add(rows, size)
+        tracing_memory = tracemalloc.is_tracing()
+        if tracing_memory:
+            call.start_memory = tracemalloc.get_traced_memory()[0]
+            # The peak is process wide, a stage running on another thread at
+            # the same time can show up in this one's number
+            tracemalloc.reset_peak()
+        stack.append(call)
+        started = time.perf_counter()
+        try:
+            yield call
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            stage = call.stage
+            with self._lock:
+                stage.seconds += elapsed - call.child_seconds
+                stage.calls += 1
+            if stack:
+                stack[-1].child_seconds += elapsed
+            if tracing_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], call.peak_seen)
+                stage.peak_bytes = max(stage.peak_bytes or 0, peak - call.start_memory)
+                if stack:
+                    stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+
+    def iterate(self, name, iterable, count_rows=len):
+        # Times each next() of a chunk iterator as one stage, so a consumer's
+        # own stage does not include the time spent producing its input
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as call:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                call.add(rows=count_rows(chunk))
+            yield chunk
+
+    def finish(self, status):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+            self.status = status
+
+    def record(self):
+        return {"session": SESSION_ID, "started_at": self.started_at.isoformat(timespec='milliseconds'),
+                "operation": self.operation, "status": self.status, "memory": tracemalloc.is_tracing(),
+                "total_ms": round((self.elapsed or 0.0) * 1000, 3),
+                "stages": [stage.record() for stage in self.stages.values()],
+                "python": platform.python_version(), "platform": platform.platform(),
+                "sqlite": sqlite3.sqlite_version}
+
+    def summary(self):
+        parts = [f"{stage.name} {stage.seconds * 1000:,.0f}ms" for stage in self.stages.values()]
+        total = f"{(self.elapsed or 0.0) * 1000:,.0f}ms"
+        return f"{self.operation}: {' | '.join(parts + ['total ' + total])}"
+
+    def details(self):
+        lines = [f"{self.operation} ({self.status}), {(self.elapsed or 0.0) * 1000:,.1f} ms total"]
+        for stage in self.stages.values():
+            line = f"{stage.name}: {stage.seconds * 1000:,.1f} ms"
+            if stage.calls > 1:
+                line += f" over {stage.calls:,} calls"
+            if stage.rows is not None:
+                line += f", {stage.rows:,} rows"
+            if stage.bytes is not None:
+                line += f", {stage.bytes / 1024 ** 2:,.1f} MB"
+            if stage.peak_bytes is not None:
+                line += f", peak {stage.peak_bytes / 1024 ** 2:,.1f} MB"
+            lines.append(line)
+        return "\n".join(lines)
+
+class TraceLog:
+    # Opt-in JSON lines file, one finished trace per line, for collecting
+    # timings from user machines
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, trace):
+        line = json.dumps(trace.record())
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+_trace_log = None
+_current = threading.local()
+
+def configure_tracing(log_path=None, memory=False):
+    # Memory peaks need tracemalloc, which makes pandas conversion and CSV
+    # writing several times slower, so they are a separate opt-in and the
+    # times in a memory trace are not comparable with the others
+    global _trace_log
+    log_path = log_path or os.environ.get(TRACE_LOG_ENV)
+    _trace_log = TraceLog(log_path) if log_path else None
+    memory = memory or os.environ.get(TRACE_MEMORY_ENV) == "1"
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _trace_log
+
+def log_trace(trace):
+    if _trace_log is not None:
+        _trace_log.write(trace)
+
+@contextmanager
+def active_trace(trace):
+    # Makes trace the one traced_stage() reports to on this thread
+    previous = getattr(_current, 'trace', None)
+    _current.trace = trace
+    try:
+        yield trace
+    finally:
+        _current.trace = previous
+
+@contextmanager
+def traced_stage(name, rows=None, size=None):
+    # For library code that does not know whether anyone is tracing it
+    trace = getattr(_current, 'trace', None)
+    if trace is None:
+        yield NullCall()
+        return
+    with trace.stage(name, rows, size) as call:
+        yield call
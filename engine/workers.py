@@ -0,0 +1,109 @@
+import threading
+import time
+from PySide6.QtCore import QObject, QThreadPool, Signal
+from engine.connections import get_connection_manager
+from engine.trace import Trace, active_trace
+
+FETCH_SIZE = 5000
+PROGRESS_OPCODES = 10000
+
+class TaskCancelled(Exception):
+    pass
+
+class TaskSignals(QObject):
+    chunk = Signal(object)
+    progress = Signal(int, float)
+    finished = Signal(object, int, float)
+    cancelled = Signal(int, float)
+    failed = Signal(str)
+
+class Task:
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+        self.trace = Trace(fn.__name__)
+        self.cancelled = False
+        self.rows = 0
+        self.started_at = None
+        self._connections = []
+        self._watched = []
+        self._lock = threading.Lock()
+
+    def start(self, pool=None):
+        self.started_at = time.perf_counter()
+        (pool or QThreadPool.globalInstance()).start(self.run)
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return time.perf_counter() - self.started_at
+
+    def connect(self, db_path):
+        # This worker thread's shared read-only connection, it stays open
+        # after the task for the next one that runs here
+        conn = get_connection_manager(db_path).connection()
+        conn.set_progress_handler(self._progress_handler, PROGRESS_OPCODES)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def watch(self, conn):
+        # Interrupt this connection on cancel without closing it afterwards
+        with self._lock:
+            self._watched.append(conn)
+
+    def _progress_handler(self):
+        return 1 if self.cancelled else 0
+
+    def cancel(self):
+        self.cancelled = True
+        # Interrupt under the lock, once run() has let go of a shared
+        # connection another task may already be using it
+        with self._lock:
+            for conn in self._connections + self._watched:
+                conn.interrupt()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise TaskCancelled()
+
+    def report(self, rows):
+        self.rows = rows
+        self.signals.progress.emit(rows, self.elapsed())
+
+    def deliver(self, chunk, rows):
+        self.check_cancelled()
+        self.signals.chunk.emit(chunk)
+        self.report(rows)
+
+    def run(self):
+        try:
+            with active_trace(self.trace):
+                result = self.fn(self, *self.args)
+            self.check_cancelled()
+        except Exception as e:
+            if self.cancelled:
+                self.signals.cancelled.emit(self.rows, self.elapsed())
+            else:
+                self.signals.failed.emit(str(e))
+            return
+        finally:
+            with self._lock:
+                connections, self._connections = self._connections, []
+                self._watched = []
+            for conn in connections:
+                conn.set_progress_handler(None, 0)
+        self.signals.finished.emit(result, self.rows, self.elapsed())
+
+def fetch_chunks(task, cursor, size=FETCH_SIZE):
+    rows = 0
+    while True:
+        task.check_cancelled()
+        with task.trace.stage("sql fetch") as stage:
+            chunk = cursor.fetchmany(size)
+            stage.add(rows=len(chunk))
+        if not chunk:
+            break
+        rows += len(chunk)
+        yield chunk, rows
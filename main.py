@@ -1,12 +1,26 @@
-import sys, os
+import sys, os, time
+from contextlib import nullcontext
+STARTED_AT = time.time()
+STARTED_CLOCK = time.perf_counter()
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QTextEdit, QTableWidget, 
-                             QTableWidgetItem, QTabWidget, QLineEdit, QLabel, QSplitter)
+                             QHBoxLayout, QPushButton, QTextEdit, QTableView,
+                             QTabWidget, QLineEdit, QLabel, QSplitter, QMessageBox,
+                             QCheckBox, QComboBox, QListWidget, QListWidgetItem)
 from PySide6.QtGui import QIcon
-from PySide6.QtCore import Qt
-import sqlite3
-import pandas as pd
-from haversine import haversine, Unit
+from PySide6.QtCore import Qt, QThreadPool, QTimer
+from engine.connections import close_connections
+from engine.export import EXPORT_CHUNK_SIZE, cursor_headers, export_csv, iter_cursor_chunks
+from engine.query_cache import (ReadOnlyGuard, database_version, frame_size,
+                                get_query_cache, is_cacheable, normalize_sql)
+from engine.query_plan import explain_query, format_query_plan, full_scans
+from engine.startup import StartupProfile, parse_app_flags
+from engine.summaries import SUMMARY_GRAINS, has_summaries, rollup_query
+from engine.text_search import RANK_LIMIT, has_text_index, match_expression, search_school_text
+from engine.trace import configure_tracing, log_trace, traced_stage
+from engine.workers import Task, fetch_chunks
+
+# pandas, NumPy and the school store take longer to import than the rest of
+# the app together, so they are imported by the first query that needs them
 
 def get_resource_path(relative_path):
     if getattr(sys, 'frozen', False):
@@ -20,6 +34,158 @@ def get_db_path():
     else:
         return 'db.sqlite'
 
+def fetch_query(task, db_path, query):
+    with task.trace.stage("imports"):
+        import pandas as pd
+    cache = get_query_cache()
+    key = normalize_sql(query)
+    version = database_version(db_path)
+    cacheable = is_cacheable(key)
+    trace = task.trace
+    if cacheable:
+        with trace.stage("cache lookup") as stage:
+            df = cache.get(key, version)
+            if df is not None:
+                stage.add(rows=len(df))
+        if df is not None:
+            task.deliver(df, len(df))
+            return True
+    conn = task.connect(db_path)
+    guard = ReadOnlyGuard()
+    with trace.stage("sql execute"):
+        conn.set_authorizer(guard)
+        try:
+            cursor = conn.execute(query)
+        finally:
+            # The connection is shared, a rejected query must not leave the
+            # guard on it for the next task
+            conn.set_authorizer(None)
+    if cursor.description is None:
+        return False
+    headers = [column[0] for column in cursor.description]
+    task.deliver(pd.DataFrame(columns=headers), 0)
+    chunks = []
+    chunks_size = 0
+    cacheable = cacheable and guard.read_only
+    for rows, total in fetch_chunks(task, cursor):
+        with trace.stage("convert", rows=len(rows)) as stage:
+            chunk = pd.DataFrame.from_records(rows, columns=headers)
+            if cacheable:
+                size = frame_size(chunk)
+                stage.add(size=size)
+                chunks.append(chunk)
+                chunks_size += size
+                if chunks_size > cache.max_bytes:
+                    chunks = []
+                    cacheable = False
+        task.deliver(chunk, total)
+    if cacheable:
+        with trace.stage("cache store", size=chunks_size):
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=headers)
+            cache.put(key, version, df)
+    return False
+
+def fetch_page(task, pager):
+    try:
+        if pager.conn is None and not pager.exhausted:
+            pager.open()
+        if pager.conn is not None:
+            task.watch(pager.conn)
+        df = pager.fetch_page()
+    except Exception:
+        pager.close()
+        raise
+    task.report(pager.rows)
+    return df
+
+def count_rows(task, db_path, query):
+    from engine.paging import count_query
+    conn = task.connect(db_path)
+    return conn.execute(count_query(query)).fetchone()[0]
+
+def explain(task, db_path, query):
+    conn = task.connect(db_path)
+    plan = explain_query(conn, query)
+    task.report(len(plan))
+    return plan
+
+def export_progress(task):
+    def progress(rows):
+        task.check_cancelled()
+        task.report(rows)
+    return progress
+
+def write_export(task, filename, headers, chunks):
+    with task.trace.stage("write csv") as stage:
+        rows = export_csv(filename, headers, chunks, on_chunk=export_progress(task))
+        stage.add(rows=rows, size=os.path.getsize(filename))
+
+def export_query(task, db_path, query, filename):
+    conn = task.connect(db_path)
+    with task.trace.stage("sql execute"):
+        cursor = conn.execute(query)
+    chunks = task.trace.iterate("sql fetch", iter_cursor_chunks(cursor))
+    write_export(task, filename, cursor_headers(cursor), chunks)
+
+def export_rows(task, filename, headers, chunks):
+    write_export(task, filename, headers, task.trace.iterate("table read", chunks))
+
+def search_schools(db_path, search):
+    with traced_stage("imports"):
+        from engine.store import get_school_store
+    store = get_school_store(db_path)
+    if search["count"] is not None:
+        return store.find_nearest(search["lat"], search["long"], search["count"], **search["filters"])
+    return store.find_nearby(search["lat"], search["long"], search["max_distance"], **search["filters"])
+
+def find_nearby_schools(task, db_path, search):
+    nearby_schools = search_schools(db_path, search)
+    task.report(len(nearby_schools))
+    return nearby_schools
+
+def export_nearby_schools(task, db_path, search, filename):
+    nearby_schools = search_schools(db_path, search)
+    task.check_cancelled()
+    with task.trace.stage("write csv", rows=len(nearby_schools)) as stage:
+        nearby_schools.to_csv(filename, index=False)
+        stage.add(size=os.path.getsize(filename))
+    task.report(len(nearby_schools))
+
+def find_school_names(task, db_path, text):
+    conn = task.connect(db_path)
+    if not has_text_index(conn):
+        raise ValueError("This database has no school name index, "
+                         "build it with load_db.py --text-index-only")
+    matches, truncated = search_school_text(conn, text)
+    task.report(len(matches))
+    return matches, truncated
+
+def fetch_summary(task, db_path, grain, state, by_type):
+    with task.trace.stage("imports"):
+        import pandas as pd
+    conn = task.connect(db_path)
+    if not has_summaries(conn):
+        raise ValueError("This database has no summary tables, "
+                         "build them with load_db.py --summaries-only")
+    query, params = rollup_query(grain, state, by_type)
+    with task.trace.stage("sql execute"):
+        cursor = conn.execute(query, params)
+    rows = []
+    for chunk, total in fetch_chunks(task, cursor):
+        rows.extend(chunk)
+        task.report(total)
+    with task.trace.stage("convert", rows=len(rows)):
+        return pd.DataFrame.from_records(rows, columns=cursor_headers(cursor))
+
+SEARCH_MODES = ["Within distance", "Nearest schools"]
+# Wait for a pause in typing before searching, most keystrokes are followed
+# by another within this long
+NAME_SEARCH_DELAY_MS = 150
+SCHOOL_TYPES = ["Any", "Regular School", "Alternative Education School",
+                "Career and Technical School", "Special Education School"]
+GRADE_CHOICES = {"Any": None, "PK": -1, "KG": 0}
+GRADE_CHOICES.update({str(grade): grade for grade in range(1, 14)})
+
 class SchoolExplorer(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -60,12 +226,142 @@ class SchoolExplorer(QMainWindow):
         self.tabs.tabBar().setExpanding(False)
         self.tabs.setContentsMargins(10, 10, 10, 10)
         self.setCentralWidget(self.tabs)
-        self.query_tab = QueryTab()
-        self.find_schools_tab = FindSchoolsTab()
+        self.find_schools_tab = LazyTab(FindSchoolsTab)
+        self.query_tab = LazyTab(QueryTab)
+        self.summaries_tab = LazyTab(SummariesTab)
         self.tabs.addTab(self.find_schools_tab, "Find Schools")
         self.tabs.addTab(self.query_tab, "Query Data")
+        self.tabs.addTab(self.summaries_tab, "Summaries")
+        self.trace_label = QLabel("")
+        self.statusBar().addWidget(self.trace_label, 1)
+        self.on_first_paint = None
 
-class QueryTab(QWidget):
+    def show_trace(self, trace):
+        # Where the last operation's time went, stage by stage; the tooltip
+        # adds calls, rows, bytes and peak memory
+        self.trace_label.setText(trace.summary())
+        self.trace_label.setToolTip(trace.details())
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.on_first_paint is not None:
+            on_first_paint, self.on_first_paint = self.on_first_paint, None
+            # Let the rest of this frame's paint events run first
+            QTimer.singleShot(0, on_first_paint)
+
+class LazyTab(QWidget):
+    # Tab page that builds its contents the first time it is shown
+    def __init__(self, tab_class):
+        super().__init__()
+        self.tab_class = tab_class
+        self.tab = None
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+    def build(self):
+        if self.tab is None:
+            self.tab = self.tab_class()
+            self.layout().addWidget(self.tab)
+        return self.tab
+
+    def showEvent(self, event):
+        self.build()
+        super().showEvent(event)
+
+class TaskTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.task = None
+        self.trace = None
+        self.task_buttons = []
+        self.cancel_button = QPushButton("CANCEL")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_task)
+        self.status_label = QLabel("")
+        self.table = None
+        self._model = None
+
+    @property
+    def model(self):
+        # The table model needs pandas, so it is made when the first results
+        # or the first query arrive rather than when the tab is built
+        if self._model is None:
+            from engine.table_model import ColumnTableModel
+            self._model = ColumnTableModel(self)
+            self.table.setModel(self._model)
+        return self._model
+
+    def start_task(self, task, on_finished=None, on_chunk=None):
+        if self.task is not None:
+            self.task.cancel()
+        self.task = task
+        self.trace = task.trace
+        signals = task.signals
+        signals.progress.connect(lambda rows, elapsed: self.task_progress(task, rows, elapsed))
+        signals.finished.connect(lambda result, rows, elapsed: self.task_finished(task, on_finished, result, rows, elapsed))
+        signals.cancelled.connect(lambda rows, elapsed: self.task_cancelled(task, rows, elapsed))
+        signals.failed.connect(lambda message: self.task_failed(task, message))
+        if on_chunk is not None:
+            signals.chunk.connect(lambda chunk: on_chunk(chunk) if task is self.task else None)
+        self.set_busy(True)
+        self.status_label.setText("Running...")
+        task.start()
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.status_label.setText("Cancelling...")
+
+    def ui_stage(self, name, rows=None):
+        # Time spent on the UI thread for the current task's results, it
+        # belongs to the same trace as the worker's stages
+        return self.trace.stage(name, rows) if self.trace is not None else nullcontext()
+
+    def finish_trace(self, task, status):
+        task.trace.finish(status)
+        log_trace(task.trace)
+        window = self.window()
+        if isinstance(window, SchoolExplorer):
+            window.show_trace(task.trace)
+
+    def set_busy(self, busy):
+        for button in self.task_buttons:
+            button.setEnabled(not busy)
+        self.cancel_button.setEnabled(busy)
+
+    def task_progress(self, task, rows, elapsed):
+        if task is self.task:
+            self.status_label.setText(f"Running... {rows:,} rows in {elapsed:.2f}s")
+
+    def task_finished(self, task, on_finished, result, rows, elapsed):
+        if task is not self.task:
+            return
+        self.task = None
+        self.set_busy(False)
+        self.status_label.setText(f"{rows:,} rows in {elapsed:.2f}s")
+        if on_finished is not None:
+            on_finished(result)
+        self.finish_trace(task, "finished")
+
+    def task_cancelled(self, task, rows, elapsed):
+        if task is not self.task:
+            return
+        self.task = None
+        self.set_busy(False)
+        self.status_label.setText(f"Cancelled after {rows:,} rows in {elapsed:.2f}s")
+        self.finish_trace(task, "cancelled")
+
+    def task_failed(self, task, message):
+        if task is not self.task:
+            return
+        self.task = None
+        self.set_busy(False)
+        self.status_label.setText("Failed")
+        self.finish_trace(task, "failed")
+        QMessageBox.critical(self, "Error", message)
+
+class QueryTab(TaskTab):
     def __init__(self):
         super().__init__()
         main_layout = QHBoxLayout()
@@ -86,7 +382,14 @@ class QueryTab(QWidget):
         self.query_text = QTextEdit()
         self.query_text.setPlaceholderText("Enter your SQL query here...")
         left_layout.addWidget(self.query_text)
+        self.plan_text = QTextEdit()
+        self.plan_text.setReadOnly(True)
+        self.plan_text.setLineWrapMode(QTextEdit.NoWrap)
+        self.plan_text.setPlaceholderText("EXPLAIN shows the query plan here")
+        self.plan_text.setStyleSheet("font-family: monospace;")
+        left_layout.addWidget(self.plan_text)
         self.run_button = QPushButton("RUN")
+        self.explain_button = QPushButton("EXPLAIN")
         self.export_button = QPushButton("EXPORT")
         button_style = """
             QPushButton {
@@ -96,60 +399,157 @@ class QueryTab(QWidget):
             }
         """
         self.run_button.setStyleSheet(button_style)
+        self.explain_button.setStyleSheet(button_style)
         self.export_button.setStyleSheet(button_style)
+        self.cancel_button.setStyleSheet(button_style)
+        self.paged_checkbox = QCheckBox("LOAD AS YOU SCROLL")
+        left_layout.addWidget(self.paged_checkbox)
         left_layout.addWidget(self.run_button)
+        left_layout.addWidget(self.explain_button)
         left_layout.addWidget(self.export_button)
+        left_layout.addWidget(self.cancel_button)
+        self.task_buttons = [self.run_button, self.explain_button, self.export_button]
         left_layout.addStretch()
         right_panel = QWidget()
         right_layout = QVBoxLayout()
         right_panel.setLayout(right_layout)
-        self.table = QTableWidget()
+        self.table = QTableView()
+        self.table.horizontalHeader().setResizeContentsPrecision(0)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         right_layout.addWidget(self.table)
+        right_layout.addWidget(self.status_label)
+        self.cache_label = QLabel("")
+        right_layout.addWidget(self.cache_label)
         main_layout.addWidget(left_panel)
         main_layout.addWidget(right_panel, stretch=1)
+        self.result_query = None
+        self.pager = None
+        self.count_task = None
+        self.row_total = None
         self.run_button.clicked.connect(self.run_query)
+        self.explain_button.clicked.connect(self.explain_query)
         self.export_button.clicked.connect(self.export_query)
 
+    def append_results(self, df):
+        first_chunk = self.model.rowCount() == 0
+        with self.ui_stage("table fill", len(df)):
+            self.model.append_frame(df)
+        if first_chunk and len(df):
+            with self.ui_stage("resize columns"):
+                self.table.resizeColumnsToContents()
+
     def run_query(self):
-        try:
-            conn = sqlite3.connect(get_db_path())
-            query = self.query_text.toPlainText()
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-            num_rows = len(df)
-            num_cols = len(df.columns)
-            self.table.setRowCount(num_rows)
-            self.table.setColumnCount(num_cols)
-            self.table.setHorizontalHeaderLabels(df.columns)
-            for row_idx in range(num_rows):
-                for col_idx in range(num_cols):
-                    value = df.iloc[row_idx, col_idx]
-                    if pd.isna(value):
-                        value = ""
-                    self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
-            self.table.resizeColumnsToContents()
-        except Exception as e:
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Error", str(e))
+        query = self.query_text.toPlainText()
+        self.result_query = None
+        self.close_pager()
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.clear()
+        if self.paged_checkbox.isChecked():
+            self.run_paged_query(query)
+            return
+        self.start_task(Task(fetch_query, get_db_path(), query),
+                        on_finished=lambda cached: self.query_finished(query, cached),
+                        on_chunk=self.append_results)
+
+    def run_paged_query(self, query):
+        from engine.paging import PagedQuery
+        self.pager = PagedQuery(get_db_path(), query)
+        self.model.fetcher = self
+        self.fetch_more()
+        self.row_total = None
+        self.count_task = Task(count_rows, get_db_path(), query)
+        count_task = self.count_task
+        count_task.signals.finished.connect(
+            lambda total, rows, elapsed: self.count_finished(count_task, total))
+        count_task.start()
+
+    def close_pager(self):
+        if self.pager is not None:
+            self.pager.close()
+            self.pager = None
+        if self.count_task is not None:
+            self.count_task.cancel()
+            self.count_task = None
+        self.model.fetcher = None
+
+    def can_fetch_more(self):
+        return self.pager is not None and self.task is None and self.pager.can_fetch_more()
+
+    def fetch_more(self):
+        pager = self.pager
+        pager.loading = True
+        self.start_task(Task(fetch_page, pager),
+                        on_finished=lambda df: self.page_loaded(pager, df))
+
+    def page_loaded(self, pager, df):
+        pager.loading = False
+        if pager is not self.pager:
+            return
+        self.append_results(df)
+        if pager.exhausted:
+            self.result_query = pager.query
+            self.row_total = pager.rows
+        self.show_page_status()
+
+    def count_finished(self, task, total):
+        if task is not self.count_task:
+            return
+        self.count_task = None
+        self.row_total = total
+        if self.pager is not None and self.task is None:
+            self.show_page_status()
+
+    def show_page_status(self):
+        shown = self.model.rowCount()
+        if self.row_total is None:
+            self.status_label.setText(f"Showing {shown:,} rows, counting...")
+        else:
+            self.status_label.setText(f"Showing {shown:,} of {self.row_total:,} rows")
+
+    def query_finished(self, query, cached):
+        self.result_query = query
+        if cached:
+            self.status_label.setText(self.status_label.text() + " (cached)")
+        self.show_cache_stats()
+
+    def explain_query(self):
+        query = self.query_text.toPlainText()
+        self.plan_text.clear()
+        self.start_task(Task(explain, get_db_path(), query),
+                        on_finished=self.show_plan)
+
+    def show_plan(self, plan):
+        self.plan_text.setPlainText(format_query_plan(plan))
+        scans = full_scans(plan)
+        if scans:
+            self.status_label.setText(f"Full table scan of {', '.join(scans)}")
+        else:
+            self.status_label.setText("No full table scans")
+
+    def show_cache_stats(self):
+        stats = get_query_cache().stats()
+        self.cache_label.setText(
+            f"Query cache: {stats['entries']} entries, "
+            f"{stats['bytes'] / 1024 ** 2:.1f} / {stats['max_bytes'] / 1024 ** 2:.0f} MB, "
+            f"{stats['hits']} hits, {stats['misses']} misses")
 
     def export_query(self):
-        try:
-            from PySide6.QtWidgets import QFileDialog
-            filename, _ = QFileDialog.getSaveFileName(
-                self, "Save CSV", "", "CSV Files (*.csv)")
-            
-            if filename:
-                conn = sqlite3.connect(get_db_path())
-                query = self.query_text.toPlainText()
-                df = pd.read_sql_query(query, conn)
-                conn.close()
-                df.to_csv(filename, index=False)
+        from PySide6.QtWidgets import QFileDialog
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save CSV", "", "CSV Files (*.csv)")
 
-        except Exception as e:
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Error", str(e))
+        if filename:
+            query = self.query_text.toPlainText()
+            if query == self.result_query and self.task is None:
+                # The table already holds this query's full result
+                task = Task(export_rows, filename, self.model.headers(),
+                            self.model.row_chunks(EXPORT_CHUNK_SIZE))
+            else:
+                task = Task(export_query, get_db_path(), query, filename)
+            self.start_task(task)
 
-class FindSchoolsTab(QWidget):
+class FindSchoolsTab(TaskTab):
     def __init__(self):
         super().__init__()
         main_layout = QHBoxLayout()
@@ -168,7 +568,7 @@ class FindSchoolsTab(QWidget):
         """)
         left_layout.addWidget(find_label)
         input_style = """
-            QLineEdit {
+            QLineEdit, QComboBox {
                 padding: 8px;
                 margin: 5px 0;
             }
@@ -176,20 +576,76 @@ class FindSchoolsTab(QWidget):
                 margin-top: 10px;
             }
         """
+        name_label = QLabel("School, district, city or county:")
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText("Start typing to search")
+        self.name_input.setStyleSheet(input_style)
+        self.name_results = QListWidget()
+        self.name_results.setMaximumHeight(200)
+        self.name_results.setVisible(False)
+        self.name_status = QLabel("")
+        self.name_status.setVisible(False)
+        self.name_task = None
+        self.name_timer = QTimer(self)
+        self.name_timer.setSingleShot(True)
+        self.name_timer.setInterval(NAME_SEARCH_DELAY_MS)
+        self.name_timer.timeout.connect(self.search_names)
+        self.name_input.textEdited.connect(self.name_edited)
+        self.name_input.returnPressed.connect(self.choose_first_name)
+        self.name_results.itemActivated.connect(self.choose_name)
+        self.name_results.itemClicked.connect(self.choose_name)
         lat_label = QLabel("Latitude:")
         self.lat_input = QLineEdit()
         self.lat_input.setStyleSheet(input_style)
         long_label = QLabel("Longitude:")
         self.long_input = QLineEdit()
         self.long_input.setStyleSheet(input_style)
-        distance_label = QLabel("Max Distance (miles):")
+        mode_label = QLabel("Search:")
+        self.mode_input = QComboBox()
+        self.mode_input.addItems(SEARCH_MODES)
+        self.mode_input.setStyleSheet(input_style)
+        self.distance_label = QLabel("Max Distance (miles):")
         self.distance_input = QLineEdit()
         self.distance_input.setText("10")
         self.distance_input.setStyleSheet(input_style)
-        for widget in [lat_label, self.lat_input, 
+        self.count_label = QLabel("Number of schools:")
+        self.count_input = QLineEdit()
+        self.count_input.setText("10")
+        self.count_input.setStyleSheet(input_style)
+        state_label = QLabel("State:")
+        self.state_input = QLineEdit()
+        self.state_input.setPlaceholderText("Any")
+        self.state_input.setStyleSheet(input_style)
+        type_label = QLabel("School type:")
+        self.type_input = QComboBox()
+        self.type_input.addItems(SCHOOL_TYPES)
+        self.type_input.setStyleSheet(input_style)
+        grades_label = QLabel("Grades:")
+        grades_row = QWidget()
+        grades_layout = QHBoxLayout()
+        grades_layout.setContentsMargins(0, 0, 0, 0)
+        grades_row.setLayout(grades_layout)
+        self.grade_low_input = QComboBox()
+        self.grade_high_input = QComboBox()
+        for grade_input in [self.grade_low_input, self.grade_high_input]:
+            grade_input.addItems(list(GRADE_CHOICES))
+            grade_input.setStyleSheet(input_style)
+        grades_layout.addWidget(self.grade_low_input)
+        grades_layout.addWidget(QLabel("to"))
+        grades_layout.addWidget(self.grade_high_input)
+        for widget in [name_label, self.name_input,
+                      self.name_results, self.name_status,
+                      lat_label, self.lat_input,
                       long_label, self.long_input,
-                      distance_label, self.distance_input]:
+                      mode_label, self.mode_input,
+                      self.distance_label, self.distance_input,
+                      self.count_label, self.count_input,
+                      state_label, self.state_input,
+                      type_label, self.type_input,
+                      grades_label, grades_row]:
             left_layout.addWidget(widget)
+        self.mode_input.currentIndexChanged.connect(self.update_mode)
+        self.update_mode()
         self.find_button = QPushButton("FIND")
         self.export_button = QPushButton("EXPORT")
         
@@ -202,138 +658,283 @@ class FindSchoolsTab(QWidget):
         """
         self.find_button.setStyleSheet(button_style)
         self.export_button.setStyleSheet(button_style)
+        self.cancel_button.setStyleSheet(button_style)
         left_layout.addWidget(self.find_button)
         left_layout.addWidget(self.export_button)
+        left_layout.addWidget(self.cancel_button)
+        self.task_buttons = [self.find_button, self.export_button]
         left_layout.addStretch()
         right_panel = QWidget()
         right_layout = QVBoxLayout()
         right_panel.setLayout(right_layout)
-        self.table = QTableWidget()
+        self.table = QTableView()
+        self.table.horizontalHeader().setResizeContentsPrecision(0)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         right_layout.addWidget(self.table)
+        right_layout.addWidget(self.status_label)
         main_layout.addWidget(left_panel)
         main_layout.addWidget(right_panel, stretch=1)
         self.find_button.clicked.connect(self.find_schools)
         self.export_button.clicked.connect(self.export_schools)
 
+    def show_results(self, df):
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        with self.ui_stage("table fill", len(df)):
+            self.model.set_frame(df)
+        with self.ui_stage("resize columns"):
+            self.table.resizeColumnsToContents()
+
+    def name_edited(self):
+        # A newer search replaces the running one, its results would be stale
+        if self.name_task is not None:
+            self.name_task.cancel()
+            self.name_task = None
+        self.name_timer.start()
+
+    def search_names(self):
+        text = self.name_input.text()
+        if match_expression(text) is None:
+            self.show_names([], False)
+            return
+        task = Task(find_school_names, get_db_path(), text)
+        self.name_task = task
+        task.signals.finished.connect(lambda result, rows, elapsed: self.names_found(task, result, elapsed))
+        task.signals.failed.connect(lambda message: self.names_failed(task, message))
+        task.start()
+
+    def names_found(self, task, result, elapsed):
+        if task is not self.name_task:
+            return
+        self.name_task = None
+        matches, truncated = result
+        self.show_names(matches, truncated, elapsed)
+
+    def names_failed(self, task, message):
+        if task is not self.name_task:
+            return
+        self.name_task = None
+        self.show_names([], False)
+        self.name_status.setText(message)
+        self.name_status.setVisible(True)
+
+    def show_names(self, matches, truncated, elapsed=None):
+        self.name_results.clear()
+        for school_name, agency, city, state, lat, long in matches:
+            item = QListWidgetItem(f"{school_name}\n{city}, {state} ({agency})")
+            item.setData(Qt.UserRole, (school_name, lat, long))
+            self.name_results.addItem(item)
+        self.name_results.setVisible(bool(matches))
+        if elapsed is None:
+            self.name_status.setVisible(False)
+            return
+        if truncated:
+            status = f"Best {len(matches)} of the first {RANK_LIMIT:,} matches, keep typing to narrow"
+        else:
+            status = f"{len(matches)} matches" if matches else "No matches"
+        self.name_status.setText(f"{status} ({elapsed * 1000:.0f} ms)")
+        self.name_status.setVisible(True)
+
+    def choose_first_name(self):
+        if self.name_results.count():
+            self.choose_name(self.name_results.item(0))
+
+    def choose_name(self, item):
+        school_name, lat, long = item.data(Qt.UserRole)
+        self.name_input.setText(school_name)
+        if lat is not None and long is not None:
+            self.lat_input.setText(str(lat))
+            self.long_input.setText(str(long))
+        self.name_results.setVisible(False)
+        self.name_status.setVisible(False)
+
+    def update_mode(self):
+        nearest = self.mode_input.currentIndex() == 1
+        self.distance_label.setVisible(not nearest)
+        self.distance_input.setVisible(not nearest)
+        self.count_label.setVisible(nearest)
+        self.count_input.setVisible(nearest)
+
+    def read_search_inputs(self):
+        lat = float(self.lat_input.text())
+        long = float(self.long_input.text())
+        if lat < -90 or lat > 90:
+            raise ValueError("Invalid latitude. Must be between -90 and 90.")
+        if long < -180 or long > 180:
+            raise ValueError("Invalid longitude. Must be between -180 and 180.")
+        search = {"lat": lat, "long": long, "max_distance": None, "count": None}
+        if self.mode_input.currentIndex() == 1:
+            count = int(self.count_input.text())
+            if count < 1:
+                raise ValueError("Invalid number of schools. Must be at least 1.")
+            search["count"] = count
+        else:
+            search["max_distance"] = float(self.distance_input.text())
+        grades = (GRADE_CHOICES[self.grade_low_input.currentText()],
+                  GRADE_CHOICES[self.grade_high_input.currentText()])
+        search["filters"] = {
+            "state": self.state_input.text().strip() or None,
+            "school_type": self.type_input.currentText() if self.type_input.currentIndex() else None,
+            "grades": grades if grades != (None, None) else None,
+        }
+        return search
+
     def find_schools(self):
         try:
-            lat = float(self.lat_input.text())
-            long = float(self.long_input.text())
-            max_distance = float(self.distance_input.text())
-            if lat < -90 or lat > 90:
-                raise ValueError("Invalid latitude. Must be between -90 and 90.")
-            if long < -180 or long > 180:
-                raise ValueError("Invalid longitude. Must be between -180 and 180.")
-            target_coor = (lat, long)
-            conn = sqlite3.connect(get_db_path())
-            query = """
-            SELECT 
-                school_name,
-                education_agency_name,
-                location_address_street_1,
-                location_address_street_2,
-                location_city,
-                location_state,
-                location_5_digit_zip_code as location_zip,
-                county_name,
-                grades_offered_lowest,
-                grades_offered_highest,
-                total_of_free_lunch_and_reducedprice_lunch_eligible,
-                total_students_all_grades_includes_ae as total_students,
-                total_elementarysecondary_students_excludes_ae as total_elementary,
-                latitude,
-                longitude
-            FROM school_data
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-            df['distance'] = df.apply(lambda row: haversine(
-                target_coor,
-                (float(row['latitude']), float(row['longitude'])),
-                unit=Unit.MILES
-            ), axis=1)
-            nearby_schools = df[df['distance'] <= max_distance].copy()
-            nearby_schools = nearby_schools.sort_values('distance')
-            nearby_schools['distance'] = nearby_schools['distance'].round(2)
-            self.table.clear()
-            num_rows = len(nearby_schools)
-            num_cols = len(nearby_schools.columns)
-            self.table.setRowCount(num_rows)
-            self.table.setColumnCount(num_cols)
-            headers = list(nearby_schools.columns)
-            self.table.setHorizontalHeaderLabels(headers)
-            for row_idx in range(num_rows):
-                for col_idx in range(num_cols):
-                    value = nearby_schools.iloc[row_idx, col_idx]
-                    if pd.isna(value):
-                        value = ""
-                    item = QTableWidgetItem(str(value))
-                    self.table.setItem(row_idx, col_idx, item)
-                    
-            self.table.resizeColumnsToContents()
-    
+            search = self.read_search_inputs()
         except Exception as e:
-            from PySide6.QtWidgets import QMessageBox
             QMessageBox.critical(self, "Error", str(e))
             print(f"Error details: {str(e)}")
+            return
+        self.start_task(Task(find_nearby_schools, get_db_path(), search),
+                        on_finished=self.show_results)
 
     def export_schools(self):
-        try:
-            from PySide6.QtWidgets import QFileDialog
-            filename, _ = QFileDialog.getSaveFileName(
-                self, "Save CSV", "", "CSV Files (*.csv)")
-            
-            if filename:
-                lat = float(self.lat_input.text())
-                long = float(self.long_input.text())
-                max_distance = float(self.distance_input.text())
-                if lat < -90 or lat > 90:
-                    raise ValueError("Invalid latitude. Must be between -90 and 90.")
-                if long < -180 or long > 180:
-                    raise ValueError("Invalid longitude. Must be between -180 and 180.")
-                conn = sqlite3.connect(get_db_path())
-                query = """
-                SELECT 
-                    school_name,
-                    education_agency_name,
-                    location_address_street_1,
-                    location_address_street_2,
-                    location_city,
-                    location_state,
-                    location_5_digit_zip_code as location_zip,
-                    county_name,
-                    grades_offered_lowest,
-                    grades_offered_highest,
-                    total_of_free_lunch_and_reducedprice_lunch_eligible,
-                    total_students_all_grades_includes_ae as total_students,
-                    total_elementarysecondary_students_excludes_ae as total_elementary,
-                    latitude,
-                    longitude
-                FROM school_data
-                """
-                df = pd.read_sql_query(query, conn)
-                conn.close()
-                target_coor = (lat, long)
-                df['distance'] = df.apply(lambda row: haversine(
-                    target_coor,
-                    (float(row['latitude']), float(row['longitude'])),
-                    unit=Unit.MILES
-                ), axis=1)
-
-                nearby_schools = df[df['distance'] <= max_distance].copy()
-                nearby_schools = nearby_schools.sort_values('distance')
-                nearby_schools['distance'] = nearby_schools['distance'].round(2)
-                nearby_schools.to_csv(filename, index=False)
-        except Exception as e:
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Error", str(e))
+        from PySide6.QtWidgets import QFileDialog
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save CSV", "", "CSV Files (*.csv)")
+
+        if filename:
+            try:
+                search = self.read_search_inputs()
+            except Exception as e:
+                QMessageBox.critical(self, "Error", str(e))
+                return
+            self.start_task(Task(export_nearby_schools, get_db_path(), search, filename))
+
+class SummariesTab(TaskTab):
+    # State, county and ZIP rollups read from the summary tables the loader
+    # builds, instead of a GROUP BY over every row of school_data
+    def __init__(self):
+        super().__init__()
+        main_layout = QHBoxLayout()
+        self.setLayout(main_layout)
+        left_panel = QWidget()
+        left_layout = QVBoxLayout()
+        left_panel.setLayout(left_layout)
+        left_panel.setFixedWidth(300)
+        summaries_label = QLabel("SUMMARIES")
+        summaries_label.setStyleSheet("""
+            QLabel {
+                font-weight: bold;
+                font-size: 16px;
+                margin-bottom: 10px;
+            }
+        """)
+        left_layout.addWidget(summaries_label)
+        input_style = """
+            QLineEdit, QComboBox {
+                padding: 8px;
+                margin: 5px 0;
+            }
+            QLabel {
+                margin-top: 10px;
+            }
+        """
+        grain_label = QLabel("Group by:")
+        self.grain_input = QComboBox()
+        self.grain_input.addItems(list(SUMMARY_GRAINS))
+        self.grain_input.setStyleSheet(input_style)
+        state_label = QLabel("State:")
+        self.state_input = QLineEdit()
+        self.state_input.setPlaceholderText("Any")
+        self.state_input.setStyleSheet(input_style)
+        self.by_type_checkbox = QCheckBox("SPLIT BY SCHOOL TYPE")
+        for widget in [grain_label, self.grain_input,
+                      state_label, self.state_input,
+                      self.by_type_checkbox]:
+            left_layout.addWidget(widget)
+        self.show_button = QPushButton("SHOW")
+        self.export_button = QPushButton("EXPORT")
+        button_style = """
+            QPushButton {
+                padding: 10px;
+                margin: 5px 0;
+                width: 100%;
+            }
+        """
+        self.show_button.setStyleSheet(button_style)
+        self.export_button.setStyleSheet(button_style)
+        self.cancel_button.setStyleSheet(button_style)
+        left_layout.addWidget(self.show_button)
+        left_layout.addWidget(self.export_button)
+        left_layout.addWidget(self.cancel_button)
+        self.task_buttons = [self.show_button, self.export_button]
+        left_layout.addStretch()
+        right_panel = QWidget()
+        right_layout = QVBoxLayout()
+        right_panel.setLayout(right_layout)
+        self.table = QTableView()
+        self.table.horizontalHeader().setResizeContentsPrecision(0)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        right_layout.addWidget(self.table)
+        right_layout.addWidget(self.status_label)
+        main_layout.addWidget(left_panel)
+        main_layout.addWidget(right_panel, stretch=1)
+        self.shown_summary = None
+        self.show_button.clicked.connect(self.show_summary)
+        self.state_input.returnPressed.connect(self.show_summary)
+        self.grain_input.currentIndexChanged.connect(self.show_summary)
+        self.by_type_checkbox.toggled.connect(self.show_summary)
+        self.export_button.clicked.connect(self.export_summary)
+        # The summaries are small, show the state rollup as soon as the tab opens
+        QTimer.singleShot(0, self.show_summary)
+
+    def show_summary(self):
+        summary = (self.grain_input.currentText(), self.state_input.text().strip() or None,
+                   self.by_type_checkbox.isChecked())
+        self.shown_summary = None
+        self.start_task(Task(fetch_summary, get_db_path(), *summary),
+                        on_finished=lambda df: self.show_results(summary, df))
+
+    def show_results(self, summary, df):
+        self.shown_summary = summary
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        with self.ui_stage("table fill", len(df)):
+            self.model.set_frame(df)
+        with self.ui_stage("resize columns"):
+            self.table.resizeColumnsToContents()
+
+    def export_summary(self):
+        from PySide6.QtWidgets import QFileDialog
+        if self.shown_summary is None:
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save CSV", "", "CSV Files (*.csv)")
+
+        if filename:
+            self.start_task(Task(export_rows, filename, self.model.headers(),
+                                 self.model.row_chunks(EXPORT_CHUNK_SIZE)))
+
+def report_startup(profile):
+    profile.mark("first paint")
+    report = profile.report()
+    if sys.stdout is not None:
+        print(report)
+    else:
+        # Windowed builds have no console to print to
+        QMessageBox.information(None, "Startup profile", report)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    profile = StartupProfile(sys.argv, STARTED_AT, STARTED_CLOCK)
+    profile.mark("imports")
+    flags, qt_argv = parse_app_flags(sys.argv)
+    # Traces are written as JSON lines with --trace-log or CURLY_TRACE_LOG,
+    # --trace-memory adds each stage's peak memory at the cost of speed
+    configure_tracing(flags.trace_log, flags.trace_memory)
+    app = QApplication(qt_argv)
+    # Worker threads keep their database connections, so keep the threads
+    QThreadPool.globalInstance().setExpiryTimeout(-1)
+    app.aboutToQuit.connect(close_connections)
     style_path = get_resource_path('styles.qss')
     with open(style_path, 'r') as style_file:
         style = style_file.read()
     app.setStyleSheet(style)
+    profile.mark("qt init")
     window = SchoolExplorer()
+    if profile.enabled:
+        window.on_first_paint = lambda: report_startup(profile)
     window.show()
+    profile.mark("window")
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,122 +1,176 @@
-from flask import Flask, request, render_template, send_file
-import sqlite3, json, io
+from flask import Flask, Response, request, render_template
+import argparse, sqlite3, json, os, sys, zlib
 import pandas as pd
-from haversine import haversine, Unit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine.connections import get_connection_manager
+from engine.export import EXPORT_CHUNK_SIZE, cursor_headers, iter_cursor_chunks, iter_csv_text
+from engine.store import get_school_store
+
+DB_PATH = os.environ.get("CURLY_DB_PATH", "db.sqlite")
+GZIP_LEVEL = 5
+MIMETYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv"}
 
 app = Flask(__name__)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.jinja_env.auto_reload = True
 
+class RequestError(Exception):
+    pass
+
+def request_params():
+    return request.get_json(silent=True) or request.values
+
+def response_format(default="json"):
+    requested = request_params().get("format") or request.args.get("format")
+    if requested:
+        if requested not in MIMETYPES:
+            raise RequestError(f"Unknown format {requested}, use one of {', '.join(MIMETYPES)}")
+        return requested
+    accept = request.accept_mimetypes
+    if accept.quality(MIMETYPES["ndjson"]) > accept.quality(MIMETYPES["json"]):
+        return "ndjson"
+    if accept.quality("text/csv") > accept.quality(MIMETYPES["json"]):
+        return "csv"
+    return default
+
+def frame_text(frames, fmt):
+    # pandas writes JSON in C and turns NaN into null, json.dumps of
+    # to_dict() wrote NaN, which browsers refuse to parse
+    wrote = False
+    if fmt == "json":
+        yield "["
+    for frame in frames:
+        if fmt == "csv":
+            yield frame.to_csv(index=False, header=not wrote)
+            wrote = True
+        elif len(frame):
+            if fmt == "ndjson":
+                yield frame.to_json(orient='records', lines=True, force_ascii=False)
+            else:
+                yield ("," if wrote else "") + frame.to_json(orient='records', force_ascii=False)[1:-1]
+            wrote = True
+    if fmt == "json":
+        yield "]"
+
+def cursor_frames(cursor):
+    headers = cursor_headers(cursor)
+    for rows in iter_cursor_chunks(cursor):
+        yield pd.DataFrame.from_records(rows, columns=headers)
+
+def column_rows(columns):
+    # Plain Python rows with None for missing values, straight from the
+    # store's arrays; a search result is small enough that building a
+    # DataFrame for it costs more than the search
+    values = []
+    for array in columns.values():
+        items = array.tolist()
+        if array.dtype.kind in 'fO':
+            items = [None if item != item else item for item in items]
+        values.append(items)
+    return list(zip(*values))
+
+def records_text(columns, fmt, size=EXPORT_CHUNK_SIZE):
+    names = list(columns)
+    rows = column_rows(columns)
+    chunks = (rows[start:start + size] for start in range(0, len(rows), size))
+    if fmt == "csv":
+        yield from iter_csv_text(names, chunks)
+        return
+    if fmt == "json":
+        yield "["
+    for i, chunk in enumerate(chunks):
+        records = [dict(zip(names, row)) for row in chunk]
+        if fmt == "ndjson":
+            yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        else:
+            yield ("," if i else "") + json.dumps(records, ensure_ascii=False)[1:-1]
+    if fmt == "json":
+        yield "]"
+
+def gzip_chunks(chunks):
+    # Sync-flush after every chunk so compressed rows still reach the client
+    # while the rest of the result is being read
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_response(text_chunks, fmt, filename=None):
+    body = (chunk.encode('utf-8') for chunk in text_chunks if chunk)
+    headers = {"Vary": "Accept-Encoding"}
+    # The parsed quality, so gzip;q=0 counts as a refusal and * as acceptance
+    if request.accept_encodings["gzip"] > 0:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(body, mimetype=MIMETYPES[fmt], headers=headers, direct_passthrough=True)
+
+def error_response(message, status):
+    return Response(json.dumps({"error": message}), status=status, mimetype=MIMETYPES["json"])
+
+def execute_query():
+    # Runs on the worker thread's shared read-only connection, so ad-hoc SQL
+    # cannot write and each request skips opening the database
+    query = request_params().get("query")
+    if not query:
+        raise RequestError("Missing query")
+    conn = get_connection_manager(DB_PATH).connection()
+    try:
+        cursor = conn.execute(query)
+    except sqlite3.Error as e:
+        raise RequestError(str(e))
+    if cursor.description is None:
+        raise RequestError("Query returned no rows")
+    return cursor
+
+def search_params():
+    params = request_params()
+    try:
+        lat = float(params["lat"])
+        long = float(params["long"])
+        max_distance = float(params.get("max_distance", 10))
+    except (KeyError, TypeError, ValueError):
+        raise RequestError("lat, long and max_distance must be numbers")
+    if lat < -90 or lat > 90:
+        raise RequestError("Invalid latitude. Must be between -90 and 90.")
+    if long < -180 or long > 180:
+        raise RequestError("Invalid longitude. Must be between -180 and 180.")
+    return lat, long, max_distance
+
+@app.errorhandler(RequestError)
+def bad_request(e):
+    return error_response(str(e), 400)
+
 @app.route('/export', methods=["POST"])
 def export_csv():
-    query = request.json["query"]
-    conn = sqlite3.connect('db.sqlite')
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    buffer = io.StringIO()
-    df.to_csv(buffer, index=False)
-    buffer.seek(0)
-    bytes_output = io.BytesIO(buffer.getvalue().encode())
-    return send_file(bytes_output, as_attachment=True, download_name="export.csv", mimetype='text/csv')
-
-@app.route('/query', methods=["POST"])
+    cursor = execute_query()
+    return stream_response(iter_csv_text(cursor_headers(cursor), iter_cursor_chunks(cursor)),
+                           "csv", "export.csv")
+
+@app.route('/query', methods=["GET", "POST"])
 def run_query():
-    query = request.json["query"]
-    conn = sqlite3.connect('db.sqlite')
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return json.dumps(df.to_dict(orient='records'))
+    fmt = response_format()
+    cursor = execute_query()
+    if fmt == "csv":
+        return stream_response(iter_csv_text(cursor_headers(cursor), iter_cursor_chunks(cursor)), fmt)
+    return stream_response(frame_text(cursor_frames(cursor), fmt), fmt)
 
 @app.route('/export-nearby-schools', methods=["POST"])
 def export_nearby_schools():
-    try:
-        lat = float(request.json["lat"])
-        long = float(request.json["long"])  
-        if lat < -90 or lat > 90:
-            return json.dumps({"error": "Invalid latitude. Must be between -90 and 90."}), 400
-        if long < -180 or long > 180:
-            return json.dumps({"error": "Invalid longitude. Must be between -180 and 180."}), 400
-        target_coor = (lat, long)
-        max_distance = float(request.json.get("max_distance", 10))
-        conn = sqlite3.connect('db.sqlite')
-        query = """
-        SELECT 
-            school_name,
-            education_agency_name,
-            location_address_street_1,
-            location_address_street_2,
-            location_city,
-            location_state,
-            location_5_digit_zip_code as location_zip,
-            county_name,
-            grades_offered_lowest,
-            grades_offered_highest,
-            total_of_free_lunch_and_reducedprice_lunch_eligible,
-            total_students_all_grades_includes_ae as total_students,
-            total_elementarysecondary_students_excludes_ae as total_elementary,
-            latitude,
-            longitude
-        FROM school_data
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        df['distance'] = df.apply(lambda row: haversine(
-            target_coor,
-            (float(row['latitude']), float(row['longitude'])),
-            unit=Unit.MILES
-        ), axis=1)
-        nearby_schools = df[df['distance'] <= max_distance].copy()
-        nearby_schools = nearby_schools.sort_values('distance')
-        nearby_schools['distance'] = nearby_schools['distance'].round(2)
-        buffer = io.StringIO()
-        nearby_schools.to_csv(buffer, index=False)
-        buffer.seek(0)
-        bytes_output = io.BytesIO(buffer.getvalue().encode())
-        return send_file(bytes_output, as_attachment=True, download_name="export.csv", mimetype="text/csv")
-    except Exception as e:
-        return json.dumps({"error": str(e)}), 500
-
-@app.route('/find-schools-query', methods=["POST"])
+    lat, long, max_distance = search_params()
+    nearby_schools = get_school_store(DB_PATH).nearby_columns(lat, long, max_distance)
+    return stream_response(records_text(nearby_schools, "csv"), "csv", "export.csv")
+
+@app.route('/find-schools-query', methods=["GET", "POST"])
 def find_schools_query():
-    lat = float(request.json["lat"])
-    long = float(request.json["long"])
-    if lat < -90 or lat > 90:
-        return json.dumps({"error": "Invalid latitude. Must be between -90 and 90."}), 400
-    if long < -180 or long > 180:
-        return json.dumps({"error": "Invalid longitude. Must be between -180 and 180."}), 400
-    target_coor = (lat, long)
-    max_distance = float(request.json.get("max_distance", 10))
-    conn = sqlite3.connect('db.sqlite')
-    query = """
-    SELECT 
-        school_name,
-        education_agency_name,
-        location_address_street_1,
-        location_address_street_2,
-        location_city,
-        location_state,
-        location_5_digit_zip_code as location_zip,
-        county_name,
-        grades_offered_lowest,
-        grades_offered_highest,
-        total_of_free_lunch_and_reducedprice_lunch_eligible,
-        total_students_all_grades_includes_ae as total_students,
-        total_elementarysecondary_students_excludes_ae as total_elementary,
-        latitude,
-        longitude
-    FROM school_data
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    df['distance'] = df.apply(lambda row: haversine(
-            target_coor,
-            (float(row['latitude']), float(row['longitude'])),
-            unit=Unit.MILES
-        ), axis=1)
-    nearby_schools = df[df['distance'] <= max_distance].copy()
-    nearby_schools = nearby_schools.sort_values('distance')
-    nearby_schools['distance'] = nearby_schools['distance'].round(2)
-    return json.dumps(nearby_schools.to_dict(orient='records'))
+    fmt = response_format()
+    lat, long, max_distance = search_params()
+    nearby_schools = get_school_store(DB_PATH).nearby_columns(lat, long, max_distance)
+    return stream_response(records_text(nearby_schools, fmt), fmt)
 
 @app.route("/", methods=["GET"])
 def home():
@@ -126,5 +180,34 @@ def home():
 def find_schools_page():
     return render_template('find-schools.html', title="Find Schools")
 
+def serve(host, port, threads, connection_limit):
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        raise SystemExit("Service mode runs on waitress, install it with pip install waitress")
+    # Load the school store and spatial index before the first request needs them
+    get_school_store(DB_PATH).get()
+    print(f"Serving {DB_PATH} on http://{host}:{port} with {threads} threads")
+    waitress_serve(app, host=host, port=port, threads=threads,
+                   connection_limit=connection_limit, asyncore_use_poll=True)
+
+def main():
+    global DB_PATH
+    parser = argparse.ArgumentParser(description="School data web app and query service.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--serve", action="store_true",
+                        help="run the production service on waitress instead of the Flask dev server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--connection-limit", type=int, default=1000)
+    parser.add_argument("--debug", action="store_true", help="Flask dev server with the debugger and reloader")
+    args = parser.parse_args()
+    DB_PATH = args.db
+    if args.serve:
+        serve(args.host, args.port, args.threads, args.connection_limit)
+    else:
+        app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,149 @@
+import argparse, csv, multiprocessing, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine.store import SchoolStore
+
+LAT_COLUMNS = ("latitude", "lat")
+LONG_COLUMNS = ("longitude", "long", "lon", "lng")
+ORIGIN_COLUMNS = ["origin_id", "origin_latitude", "origin_longitude", "rank"]
+
+_school_data = None
+_search = None
+
+def find_column(headers, requested, candidates):
+    lowered = {header.strip().lower(): header for header in headers}
+    for name in ([requested] if requested else candidates):
+        if name and name.lower() in lowered:
+            return lowered[name.lower()]
+    return None
+
+def read_origins(input_file, id_column=None, lat_column=None, long_column=None):
+    skipped = 0
+    with open(input_file, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile)
+        headers = reader.fieldnames or []
+        lat_key = find_column(headers, lat_column, LAT_COLUMNS)
+        long_key = find_column(headers, long_column, LONG_COLUMNS)
+        id_key = find_column(headers, id_column, ("id",))
+        if lat_key is None or long_key is None:
+            raise ValueError(f"{input_file} needs latitude and longitude columns")
+        if id_column and id_key is None:
+            raise ValueError(f"{input_file} has no column named {id_column}")
+        for row_number, row in enumerate(reader, start=1):
+            try:
+                lat = float(row[lat_key])
+                long = float(row[long_key])
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if lat < -90 or lat > 90 or long < -180 or long > 180:
+                skipped += 1
+                continue
+            origin_id = row[id_key] if id_key else row_number
+            yield origin_id, lat, long
+    if skipped:
+        print(f"Skipped {skipped} rows with missing or invalid coordinates")
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def init_worker(db_file, search):
+    global _school_data, _search
+    # Forked workers inherit the parent's store, grid and KD-tree. Spawned
+    # ones start empty and load their own: the snapshot columns are mapped
+    # and shared, but each worker builds its own grid and, for --k, its own
+    # KD-tree on first use
+    if _school_data is None:
+        _school_data = SchoolStore(db_file).get(quiet=True)
+    _search = search
+
+def search_origin(origin_id, lat, long):
+    if _search["k"] is not None:
+        schools = _school_data.find_nearest(lat, long, _search["k"], **_search["filters"])
+    else:
+        schools = _school_data.find_nearby(lat, long, _search["radius"], **_search["filters"])
+    schools.insert(0, "rank", range(1, len(schools) + 1))
+    schools.insert(0, "origin_longitude", long)
+    schools.insert(0, "origin_latitude", lat)
+    schools.insert(0, "origin_id", origin_id)
+    return schools
+
+def search_chunk(origins):
+    import pandas as pd
+    frames = [search_origin(*origin) for origin in origins]
+    results = pd.concat(frames, ignore_index=True)
+    return len(origins), len(results), results.to_csv(header=False, index=False)
+
+def result_headers(school_data):
+    return ORIGIN_COLUMNS + school_data.result_columns + ["distance"]
+
+def run_batch(input_file, output_file, db_file, radius=None, k=None, filters=None,
+              workers=None, chunk_size=100, id_column=None, lat_column=None, long_column=None):
+    global _school_data
+    started = time.perf_counter()
+    school_data = SchoolStore(db_file).get()
+    search = {"radius": radius, "k": k, "filters": filters or {}}
+    if k is not None:
+        # Built before the pool starts so forked workers inherit it
+        school_data.kdtree
+    print(f"Loaded index in {time.perf_counter() - started:.2f}s")
+    origins = read_origins(input_file, id_column, lat_column, long_column)
+    total_origins = 0
+    total_rows = 0
+    search_started = time.perf_counter()
+    last_report = search_started
+    with open(output_file, 'w', newline='', encoding='utf-8') as outfile:
+        csv.writer(outfile).writerow(result_headers(school_data))
+        _school_data = school_data
+        with multiprocessing.Pool(workers, initializer=init_worker,
+                                  initargs=(db_file, search)) as pool:
+            for origin_count, row_count, text in pool.imap(search_chunk, chunked(origins, chunk_size)):
+                outfile.write(text)
+                total_origins += origin_count
+                total_rows += row_count
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    rate = total_origins / (now - search_started)
+                    print(f"{total_origins:,} origins, {total_rows:,} rows, {rate:,.0f} origins/s")
+                    last_report = now
+    elapsed = time.perf_counter() - search_started
+    rate = total_origins / elapsed if elapsed else 0
+    print(f"Complete. {total_origins:,} origins, {total_rows:,} rows written to {output_file}")
+    print(f"Searched in {elapsed:.2f}s ({rate:,.0f} origins/s)")
+    return total_origins, total_rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Find schools near every origin in a CSV of coordinates.")
+    parser.add_argument("input", help="CSV with latitude and longitude columns")
+    parser.add_argument("output", help="CSV to write, one row per origin and school")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--radius", type=float, help="find schools within this many miles")
+    mode.add_argument("--k", type=int, help="find this many nearest schools")
+    parser.add_argument("--db", default="../db.sqlite")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to CPU count")
+    parser.add_argument("--chunk-size", type=int, default=100, help="origins per worker task")
+    parser.add_argument("--id-column", help="column to copy into origin_id, defaults to id or row number")
+    parser.add_argument("--lat-column")
+    parser.add_argument("--long-column")
+    parser.add_argument("--state")
+    parser.add_argument("--school-type")
+    args = parser.parse_args()
+    filters = {"state": args.state, "school_type": args.school_type}
+    try:
+        run_batch(args.input, args.output, args.db, radius=args.radius, k=args.k,
+                  filters=filters, workers=args.workers, chunk_size=args.chunk_size,
+                  id_column=args.id_column, lat_column=args.lat_column,
+                  long_column=args.long_column)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
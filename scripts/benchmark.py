@@ -0,0 +1,227 @@
+import argparse, contextlib, io, json, os, platform, sqlite3, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine.connections import open_read_only
+from engine.export import export_query_csv
+from engine.kdtree import KDTree
+from engine.spatial import GridIndex
+from engine.store import SchoolStore
+from engine.workers import FETCH_SIZE
+from generate_school_data import write_school_csv
+from load_db import seed_data
+
+# Times the app's hot paths against synthetic school_data tables and writes
+# the results as JSON, so runs on different commits can be compared with
+# --compare
+RESULTS_FORMAT = 1
+DEFAULT_ROWS = [100000]
+SEARCH_ORIGINS = 200
+SEARCH_MILES = 10
+NEAREST_COUNT = 10
+# The Query tab keeps every row it shows, past a few million rows that no
+# longer fits in memory, so the grid benchmark stops here
+GRID_ROWS = 1000000
+VISIBLE_ROWS = 40
+FULL_QUERY = "SELECT * FROM school_data"
+BENCHMARKS = ["seed_data", "store_load", "radius_search", "nearest_search", "query_load",
+              "grid_populate", "csv_export", "grid_index", "kdtree_build", "all_neighbors"]
+
+def git_commit():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+def environment():
+    commit, dirty = git_commit()
+    return {"commit": commit, "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "sqlite": sqlite3.sqlite_version,
+            "numpy": np.__version__, "pandas": pd.__version__}
+
+def summary(seconds, operations=1, latencies=None):
+    result = {"seconds": [round(value, 6) for value in seconds],
+              "min": round(min(seconds), 6), "median": round(float(np.median(seconds)), 6),
+              "operations": operations,
+              "per_second": round(operations / float(np.median(seconds)), 1) if np.median(seconds) else None}
+    if latencies:
+        latencies = np.asarray(latencies) * 1000
+        result["latency_ms"] = {"median": round(float(np.median(latencies)), 3),
+                                "p95": round(float(np.percentile(latencies, 95)), 3),
+                                "max": round(float(latencies.max()), 3)}
+    return result
+
+def timed(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+def quietly(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+def search_origins(data, count, seed):
+    # Start from real school locations, nudged a little, so searches land
+    # where the schools are the way user searches do
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(data), count)
+    lats = np.asarray(data.columns['latitude'], dtype=np.float64)[rows] + rng.normal(0, 0.05, count)
+    longs = np.asarray(data.columns['longitude'], dtype=np.float64)[rows] + rng.normal(0, 0.05, count)
+    return list(zip(np.clip(lats, -90, 90).tolist(), np.clip(longs, -180, 180).tolist()))
+
+def time_searches(search, origins, repeat):
+    seconds, latencies = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for lat, long in origins:
+            query_started = time.perf_counter()
+            search(lat, long)
+            latencies.append(time.perf_counter() - query_started)
+        seconds.append(time.perf_counter() - started)
+    return summary(seconds, len(origins), latencies)
+
+def query_frames(db_file, limit=None):
+    # Same chunking the Query tab's fetch_query task uses
+    conn = open_read_only(db_file)
+    try:
+        query = FULL_QUERY if limit is None else f"{FULL_QUERY} LIMIT {int(limit)}"
+        cursor = conn.execute(query)
+        headers = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=headers)
+    finally:
+        conn.close()
+
+def populate_grid(frames):
+    from engine.table_model import ColumnTableModel
+    model = ColumnTableModel()
+    for frame in frames:
+        model.append_frame(frame)
+    for row in range(min(VISIBLE_ROWS, model.rowCount())):
+        for column in range(model.columnCount()):
+            model.data(model.index(row, column))
+    model.sort(0)
+    return model.rowCount()
+
+def run_benchmarks(rows, seed, workdir, repeat, only):
+    csv_file = os.path.join(workdir, f"schools_{rows}_{seed}.csv")
+    db_file = os.path.join(workdir, f"schools_{rows}_{seed}.sqlite")
+    results = {}
+    selected = [name for name in BENCHMARKS if only is None or name in only]
+    if not os.path.exists(csv_file):
+        started = time.perf_counter()
+        write_school_csv(csv_file, rows, seed)
+        print(f"  generated {csv_file} in {time.perf_counter() - started:.1f}s")
+    if "seed_data" in selected or not os.path.exists(db_file):
+        seconds = timed(lambda: quietly(seed_data, csv_file, db_file, "school_data"), 1)
+        if "seed_data" in selected:
+            results["seed_data"] = summary(seconds, rows)
+    data = None
+    if "store_load" in selected:
+        results["store_load"] = summary(timed(lambda: quietly(SchoolStore(db_file).get), repeat))
+    if any(name in selected for name in ("radius_search", "nearest_search", "grid_index", "kdtree_build",
+                                         "all_neighbors")):
+        data = quietly(SchoolStore(db_file).get)
+        origins = search_origins(data, SEARCH_ORIGINS, seed)
+    if "radius_search" in selected:
+        data.find_nearby(*origins[0], SEARCH_MILES)
+        results["radius_search"] = time_searches(
+            lambda lat, long: data.find_nearby(lat, long, SEARCH_MILES), origins, repeat)
+    if "nearest_search" in selected:
+        data.find_nearest(*origins[0], NEAREST_COUNT)
+        results["nearest_search"] = time_searches(
+            lambda lat, long: data.find_nearest(lat, long, NEAREST_COUNT), origins, repeat)
+    if "query_load" in selected:
+        results["query_load"] = summary(timed(lambda: sum(len(frame) for frame in query_frames(db_file)), repeat), rows)
+    if "grid_populate" in selected:
+        grid_rows = min(rows, GRID_ROWS)
+        frames = list(query_frames(db_file, grid_rows))
+        results["grid_populate"] = summary(timed(lambda: populate_grid(frames), repeat), grid_rows)
+        del frames
+    if "csv_export" in selected:
+        conn = open_read_only(db_file)
+        handle, export_file = tempfile.mkstemp(suffix=".csv", dir=workdir)
+        os.close(handle)
+        try:
+            results["csv_export"] = summary(timed(lambda: export_query_csv(conn, FULL_QUERY, export_file), repeat), rows)
+        finally:
+            conn.close()
+            os.remove(export_file)
+    if "grid_index" in selected:
+        lats, longs = data.columns['latitude'], data.columns['longitude']
+        results["grid_index"] = summary(timed(lambda: GridIndex(lats, longs), repeat), rows)
+    if "kdtree_build" in selected:
+        results["kdtree_build"] = summary(timed(lambda: KDTree(data.latitudes, data.longitudes), repeat), rows)
+    if "all_neighbors" in selected:
+        # One process, school_neighbors.py spreads the same leaves over a pool
+        tree = data.kdtree
+        results["all_neighbors"] = summary(
+            timed(lambda: [tree.leaf_neighbors(leaf, NEAREST_COUNT) for leaf in tree.leaves()], repeat), rows)
+    return results
+
+def print_results(results):
+    for name, result in results.items():
+        line = f"  {name:<15} median {result['median']:9.4f}s  min {result['min']:9.4f}s"
+        if "latency_ms" in result:
+            latency = result["latency_ms"]
+            line += f"  {latency['median']:.2f}ms/query (p95 {latency['p95']:.2f}ms)"
+        elif result["operations"] > 1:
+            line += f"  {result['per_second']:,.0f} rows/s"
+        print(line)
+
+def compare_results(previous, current):
+    # Median of each benchmark against the same row count in an earlier run
+    before = {(run["rows"], name): result["median"]
+              for run in previous["runs"] for name, result in run["benchmarks"].items()}
+    print(f"Compared with {previous.get('commit') or 'unknown commit'} ({previous.get('created_at')})")
+    for run in current["runs"]:
+        for name, result in run["benchmarks"].items():
+            old = before.get((run["rows"], name))
+            if old is None:
+                continue
+            change = (result["median"] - old) / old * 100 if old else 0.0
+            print(f"  {run['rows']:>10,} {name:<15} {old:9.4f}s -> {result['median']:9.4f}s  {change:+6.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading, searching and exporting synthetic school data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="table sizes to benchmark, e.g. 100000 1000000 10000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", default="benchmark_data",
+                        help="where generated CSVs and databases are kept between runs")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {"format": RESULTS_FORMAT, **environment(), "repeat": args.repeat, "runs": []}
+    for rows in args.rows:
+        print(f"{rows:,} rows")
+        results = run_benchmarks(rows, args.seed, args.workdir, args.repeat, args.only)
+        print_results(results)
+        report["runs"].append({"rows": rows, "seed": args.seed, "benchmarks": results})
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
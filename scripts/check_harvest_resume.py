@@ -0,0 +1,97 @@
+import argparse, csv, os, sqlite3, sys, tempfile, threading
+import nces_data_harvest
+from fake_nces_server import FakeLayer, serve
+from nces_data_harvest import CsvOutput, Harvester, SqliteOutput, harvest
+
+# Offline check of an interrupted and resumed harvest: runs nces_data_harvest
+# against the fake layer with simulated failures, stops it part way with a
+# KeyboardInterrupt, resumes from the checkpoint and checks that both
+# outputs hold every record exactly once.
+
+class InterruptedHarvester(Harvester):
+    # Raises KeyboardInterrupt on the stop_after'th page request, the way
+    # Ctrl+C lands in the middle of a harvest
+    def __init__(self, layer_url, stop_after, **kwargs):
+        super().__init__(layer_url, **kwargs)
+        self.stop_after = stop_after
+        self.pages = 0
+        self.lock = threading.Lock()
+
+    def query_page(self, offset, page_size):
+        with self.lock:
+            self.pages += 1
+            stop = self.pages == self.stop_after
+        if stop:
+            raise KeyboardInterrupt
+        return super().query_page(offset, page_size)
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok: {message}")
+
+def csv_ids(csv_file):
+    with open(csv_file, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        return [int(row[0]) for row in reader]
+
+def run_check(rows, page_size, fail_rate, stop_after, workers):
+    # Failed requests are retried, keep the backoff short
+    nces_data_harvest.BACKOFF_BASE = 0.01
+    layer = FakeLayer(rows, max_record_count=page_size, fail_rate=fail_rate)
+    server, url = serve(layer)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            csv_file = os.path.join(work_dir, "schools.csv")
+            db_file = os.path.join(work_dir, "schools.sqlite")
+            checkpoint_file = os.path.join(work_dir, "harvest.checkpoint.json")
+            outputs = lambda: [CsvOutput(csv_file), SqliteOutput(db_file)]
+
+            harvester = InterruptedHarvester(url, stop_after, workers=workers, rate=0)
+            try:
+                harvest(harvester, outputs(), checkpoint_file)
+            except KeyboardInterrupt:
+                pass
+            else:
+                raise AssertionError(f"harvest finished before page request {stop_after}, lower --stop-after")
+            check(os.path.exists(checkpoint_file), "interrupted harvest left a checkpoint")
+            written = len(csv_ids(csv_file))
+            check(0 < written < rows, f"interrupted harvest wrote {written:,} of {rows:,} rows")
+
+            harvest(Harvester(url, workers=workers, rate=0), outputs(), checkpoint_file)
+            check(not os.path.exists(checkpoint_file), "resumed harvest removed the checkpoint")
+
+            ids = csv_ids(csv_file)
+            check(len(ids) == rows, f"CSV has {len(ids):,} rows")
+            check(len(set(ids)) == len(ids), "CSV has no duplicate OBJECTIDs")
+            check(sorted(ids) == list(range(1, rows + 1)), "CSV has every OBJECTID")
+            conn = sqlite3.connect(db_file)
+            try:
+                count, distinct = conn.execute(
+                    "SELECT COUNT(*), COUNT(DISTINCT objectid) FROM school_data").fetchone()
+            finally:
+                conn.close()
+            check(count == rows, f"SQLite table has {count:,} rows")
+            check(distinct == count, "SQLite table has no duplicate OBJECTIDs")
+    finally:
+        server.shutdown()
+    print(f"Served {layer.requests:,} requests, {layer.failures:,} simulated failures")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that an interrupted harvest resumes without losing or repeating rows.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="fraction of requests that fail")
+    parser.add_argument("--stop-after", type=int, default=6, help="page request to interrupt the first harvest at")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    try:
+        run_check(args.rows, args.page_size, args.fail_rate, args.stop_after, args.workers)
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        sys.exit(1)
+    print("Harvest resume check passed")
+
+if __name__ == "__main__":
+    main()
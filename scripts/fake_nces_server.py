@@ -0,0 +1,166 @@
+import argparse, csv, json, os, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from load_db import CONVERTERS, is_null, value_type
+
+# Stand-in for the ArcGIS layer nces_data_harvest.py talks to. Serves the
+# layer info, returnCountOnly and paged query requests from synthetic rows
+# built out of csvs/test_file.csv, with optional latency and failures.
+TEMPLATE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csvs', 'test_file.csv')
+LAYER_PATH = "/opengis/rest/services/K12_School_Locations/EDGE_ADMINDATA_PUBLICSCH_2223/MapServer/0"
+MAX_RECORD_COUNT = 2000
+ESRI_TYPES = {'INTEGER': "esriFieldTypeInteger", 'NUMERIC': "esriFieldTypeDouble", 'TEXT': "esriFieldTypeString"}
+
+def field_name(alias):
+    return re.sub(r'[^A-Z0-9]+', '_', alias.upper()).strip('_')
+
+def load_template(template_csv):
+    with open(template_csv, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        aliases = next(reader)
+        rows = list(reader)
+    return aliases, rows
+
+def column_types(rows, width):
+    types = []
+    for i in range(width):
+        kinds = {value_type(row[i]) for row in rows if not is_null(row[i])}
+        types.append('TEXT' if 'TEXT' in kinds else 'NUMERIC' if 'NUMERIC' in kinds else 'INTEGER')
+    return types
+
+def typed_value(value, kind):
+    # The service sends JSON numbers for numeric fields and null for missing values
+    return None if is_null(value) else CONVERTERS[kind](value)
+
+def build_records(count, template_csv=TEMPLATE_CSV, seed=1):
+    aliases, rows = load_template(template_csv)
+    names = ["OBJECTID"] + [field_name(alias) for alias in aliases[1:]]
+    types = column_types(rows, len(aliases))
+    types[-2] = types[-1] = 'NUMERIC'
+    rows = [[typed_value(value, kind) for value, kind in zip(row, types)] for row in rows]
+    fields = [{"name": name, "type": ESRI_TYPES[kind], "alias": alias}
+              for name, kind, alias in zip(names, types, aliases)]
+    fields[0]["type"] = "esriFieldTypeOID"
+    rng = random.Random(seed)
+    records = []
+    for object_id in range(1, count + 1):
+        values = list(rng.choice(rows))
+        values[0] = object_id
+        values[1] = 10000000000 + object_id
+        values[-2] = round(rng.uniform(25, 49), 6)
+        values[-1] = round(rng.uniform(-124, -67), 6)
+        records.append(dict(zip(names, values)))
+    # The real service does not return rows in OBJECTID order unless asked
+    rng.shuffle(records)
+    return fields, records
+
+class FakeLayer:
+    def __init__(self, count, max_record_count=MAX_RECORD_COUNT, latency=0, fail_rate=0, seed=1):
+        self.fields, self.records = build_records(count, seed=seed)
+        self.field_aliases = {field["name"]: field["alias"] for field in self.fields}
+        self.max_record_count = max_record_count
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.sorted_records = {}
+        self.lock = threading.Lock()
+
+    def layer_info(self):
+        return {"name": "Fake public schools", "maxRecordCount": self.max_record_count,
+                "fields": self.fields}
+
+    def query(self, params):
+        if params.get("returnCountOnly") == "true":
+            return {"count": len(self.records)}
+        records = self.ordered(params.get("orderByFields"))
+        offset = int(params.get("resultOffset", 0))
+        count = min(int(params.get("resultRecordCount", self.max_record_count)), self.max_record_count)
+        page = records[offset:offset + count]
+        return {"fieldAliases": self.field_aliases,
+                "fields": self.fields,
+                "features": [{"attributes": record} for record in page],
+                "exceededTransferLimit": offset + count < len(records)}
+
+    def ordered(self, order_by):
+        if not order_by:
+            return self.records
+        with self.lock:
+            if order_by not in self.sorted_records:
+                field, _, direction = order_by.partition(" ")
+                self.sorted_records[order_by] = sorted(
+                    self.records, key=lambda record: record[field],
+                    reverse=direction.upper() == "DESC")
+            return self.sorted_records[order_by]
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.fail_rate
+            if failed:
+                self.failures += 1
+            return failed
+
+def make_handler(layer):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if layer.latency:
+                time.sleep(layer.latency)
+            if layer.should_fail():
+                self.send_json({"error": {"code": 500, "message": "Simulated failure"}},
+                               self.random_status())
+                return
+            if url.path.rstrip("/") == LAYER_PATH:
+                self.send_json(layer.layer_info())
+            elif url.path == f"{LAYER_PATH}/query":
+                self.send_json(layer.query(params))
+            else:
+                self.send_json({"error": {"code": 404, "message": "Not found"}}, 404)
+
+        def random_status(self):
+            # ArcGIS sends some errors as 200 with an error body
+            with layer.lock:
+                return layer.random.choice([200, 500, 503])
+
+        def send_json(self, data, status=200):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def serve(layer, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), make_handler(layer))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}{LAYER_PATH}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake NCES school layer for harvester testing.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=101390)
+    parser.add_argument("--max-record-count", type=int, default=MAX_RECORD_COUNT)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    args = parser.parse_args()
+    layer = FakeLayer(args.rows, args.max_record_count, args.latency, args.fail_rate)
+    server, url = serve(layer, port=args.port)
+    print(f"Serving {args.rows:,} records at {url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Served {layer.requests:,} requests, {layer.failures:,} simulated failures")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse, csv, os, time
+import numpy as np
+
+# Synthetic stand-in for the NCES public school CSV: same 75 columns as
+# csvs/test_file.csv, schools spread over the states in roughly the real
+# proportions, about half of them clustered around metro areas
+TEMPLATE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csvs', 'test_file.csv')
+CHUNK_SIZE = 50000
+METRO_SHARE = 0.55
+METRO_SPREAD = 0.3
+
+# state, FIPS code, center latitude and longitude, latitude and longitude spread
+# (degrees), schools in 2022-23
+STATES = [
+    ("AL", 1, 32.8, -86.8, 1.2, 0.8, 1500), ("AK", 2, 61.2, -149.9, 2.5, 6.0, 500),
+    ("AZ", 4, 33.6, -111.9, 1.3, 1.3, 2400), ("AR", 5, 34.9, -92.4, 1.0, 1.3, 1100),
+    ("CA", 6, 36.0, -119.5, 2.5, 1.8, 10300), ("CO", 8, 39.5, -105.2, 0.9, 1.5, 1900),
+    ("CT", 9, 41.6, -72.7, 0.3, 0.5, 1000), ("DE", 10, 39.2, -75.5, 0.4, 0.2, 230),
+    ("DC", 11, 38.9, -77.03, 0.04, 0.04, 230), ("FL", 12, 28.0, -81.7, 1.5, 1.2, 4300),
+    ("GA", 13, 33.2, -83.6, 1.1, 1.0, 2300), ("HI", 15, 21.0, -157.5, 0.5, 1.2, 290),
+    ("ID", 16, 44.2, -115.5, 1.5, 1.0, 780), ("IL", 17, 40.6, -89.2, 1.6, 1.0, 4400),
+    ("IN", 18, 40.0, -86.2, 1.1, 0.8, 1900), ("IA", 19, 42.0, -93.4, 0.7, 1.8, 1300),
+    ("KS", 20, 38.5, -97.5, 0.8, 2.0, 1300), ("KY", 21, 37.6, -85.3, 0.7, 1.8, 1500),
+    ("LA", 22, 30.9, -91.9, 1.0, 1.2, 1400), ("ME", 23, 44.8, -69.4, 1.0, 0.9, 600),
+    ("MD", 24, 39.1, -76.8, 0.4, 0.8, 1400), ("MA", 25, 42.3, -71.6, 0.4, 0.9, 1850),
+    ("MI", 26, 43.3, -84.5, 1.3, 1.3, 3500), ("MN", 27, 45.5, -93.9, 1.5, 1.5, 2600),
+    ("MS", 28, 32.7, -89.7, 1.2, 0.7, 1000), ("MO", 29, 38.4, -92.4, 1.0, 1.6, 2400),
+    ("MT", 30, 46.9, -109.6, 1.2, 3.0, 820), ("NE", 31, 41.5, -98.5, 0.8, 2.3, 1050),
+    ("NV", 32, 37.5, -116.5, 2.0, 1.5, 750), ("NH", 33, 43.6, -71.6, 0.8, 0.5, 490),
+    ("NJ", 34, 40.3, -74.5, 0.6, 0.4, 2600), ("NM", 35, 34.5, -106.1, 1.5, 1.4, 890),
+    ("NY", 36, 42.5, -75.0, 1.0, 2.0, 4800), ("NC", 37, 35.5, -79.4, 0.8, 2.2, 2700),
+    ("ND", 38, 47.4, -100.5, 0.8, 2.5, 530), ("OH", 39, 40.3, -82.8, 1.0, 1.2, 3600),
+    ("OK", 40, 35.6, -97.5, 0.9, 2.0, 1800), ("OR", 41, 44.1, -121.5, 1.3, 1.8, 1300),
+    ("PA", 42, 40.9, -77.6, 0.7, 1.9, 2900), ("RI", 44, 41.7, -71.5, 0.15, 0.15, 310),
+    ("SC", 45, 33.9, -80.9, 0.8, 1.0, 1300), ("SD", 46, 44.4, -100.2, 0.9, 2.2, 700),
+    ("TN", 47, 35.8, -86.4, 0.6, 2.3, 1900), ("TX", 48, 31.0, -97.5, 2.5, 3.0, 9300),
+    ("UT", 49, 40.2, -111.8, 1.3, 1.0, 1100), ("VT", 50, 44.0, -72.7, 0.6, 0.4, 300),
+    ("VA", 51, 37.6, -78.2, 0.8, 2.0, 2100), ("WA", 53, 47.4, -121.0, 1.0, 2.0, 2500),
+    ("WV", 54, 38.6, -80.6, 0.8, 1.1, 700), ("WI", 55, 44.5, -89.8, 1.2, 1.3, 2300),
+    ("WY", 56, 43.0, -107.5, 1.2, 2.0, 360), ("PR", 72, 18.2, -66.4, 0.15, 0.6, 850),
+]
+# state, city, county, ZIP prefix, latitude, longitude
+METROS = [
+    ("AL", "Birmingham", "Jefferson County", "352", 33.52, -86.81), ("AK", "Anchorage", "Anchorage Municipality", "995", 61.22, -149.90),
+    ("AZ", "Phoenix", "Maricopa County", "850", 33.45, -112.07), ("AZ", "Tucson", "Pima County", "857", 32.22, -110.97),
+    ("AR", "Little Rock", "Pulaski County", "722", 34.75, -92.29), ("CA", "Los Angeles", "Los Angeles County", "900", 34.05, -118.24),
+    ("CA", "San Diego", "San Diego County", "921", 32.72, -117.16), ("CA", "San Jose", "Santa Clara County", "951", 37.34, -121.89),
+    ("CA", "Fresno", "Fresno County", "937", 36.74, -119.79), ("CA", "Sacramento", "Sacramento County", "958", 38.58, -121.49),
+    ("CO", "Denver", "Denver County", "802", 39.74, -104.99), ("CT", "Hartford", "Hartford County", "061", 41.76, -72.68),
+    ("DE", "Wilmington", "New Castle County", "198", 39.74, -75.55), ("DC", "Washington", "District of Columbia", "200", 38.90, -77.04),
+    ("FL", "Miami", "Miami-Dade County", "331", 25.76, -80.19), ("FL", "Orlando", "Orange County", "328", 28.54, -81.38),
+    ("FL", "Tampa", "Hillsborough County", "336", 27.95, -82.46), ("FL", "Jacksonville", "Duval County", "322", 30.33, -81.66),
+    ("GA", "Atlanta", "Fulton County", "303", 33.75, -84.39), ("HI", "Honolulu", "Honolulu County", "968", 21.31, -157.86),
+    ("ID", "Boise", "Ada County", "837", 43.62, -116.20), ("IL", "Chicago", "Cook County", "606", 41.88, -87.63),
+    ("IN", "Indianapolis", "Marion County", "462", 39.77, -86.16), ("IA", "Des Moines", "Polk County", "503", 41.59, -93.62),
+    ("KS", "Wichita", "Sedgwick County", "672", 37.69, -97.34), ("KY", "Louisville", "Jefferson County", "402", 38.25, -85.76),
+    ("LA", "New Orleans", "Orleans Parish", "701", 29.95, -90.07), ("ME", "Portland", "Cumberland County", "041", 43.66, -70.26),
+    ("MD", "Baltimore", "Baltimore City", "212", 39.29, -76.61), ("MA", "Boston", "Suffolk County", "021", 42.36, -71.06),
+    ("MI", "Detroit", "Wayne County", "482", 42.33, -83.05), ("MN", "Minneapolis", "Hennepin County", "554", 44.98, -93.27),
+    ("MS", "Jackson", "Hinds County", "392", 32.30, -90.18), ("MO", "St. Louis", "St. Louis County", "631", 38.63, -90.20),
+    ("MO", "Kansas City", "Jackson County", "641", 39.10, -94.58), ("MT", "Billings", "Yellowstone County", "591", 45.78, -108.50),
+    ("NE", "Omaha", "Douglas County", "681", 41.26, -95.94), ("NV", "Las Vegas", "Clark County", "891", 36.17, -115.14),
+    ("NH", "Manchester", "Hillsborough County", "031", 42.99, -71.46), ("NJ", "Newark", "Essex County", "071", 40.74, -74.17),
+    ("NM", "Albuquerque", "Bernalillo County", "871", 35.08, -106.65), ("NY", "New York", "Kings County", "112", 40.68, -73.94),
+    ("NY", "Buffalo", "Erie County", "142", 42.89, -78.88), ("NC", "Charlotte", "Mecklenburg County", "282", 35.23, -80.84),
+    ("NC", "Raleigh", "Wake County", "276", 35.78, -78.64), ("ND", "Fargo", "Cass County", "581", 46.88, -96.79),
+    ("OH", "Columbus", "Franklin County", "432", 39.96, -83.00), ("OH", "Cleveland", "Cuyahoga County", "441", 41.50, -81.69),
+    ("OH", "Cincinnati", "Hamilton County", "452", 39.10, -84.51), ("OK", "Oklahoma City", "Oklahoma County", "731", 35.47, -97.52),
+    ("OR", "Portland", "Multnomah County", "972", 45.52, -122.68), ("PA", "Philadelphia", "Philadelphia County", "191", 39.95, -75.17),
+    ("PA", "Pittsburgh", "Allegheny County", "152", 40.44, -80.00), ("RI", "Providence", "Providence County", "029", 41.82, -71.41),
+    ("SC", "Columbia", "Richland County", "292", 34.00, -81.03), ("SD", "Sioux Falls", "Minnehaha County", "571", 43.55, -96.73),
+    ("TN", "Nashville", "Davidson County", "372", 36.16, -86.78), ("TN", "Memphis", "Shelby County", "381", 35.15, -90.05),
+    ("TX", "Houston", "Harris County", "770", 29.76, -95.37), ("TX", "Dallas", "Dallas County", "752", 32.78, -96.80),
+    ("TX", "San Antonio", "Bexar County", "782", 29.42, -98.49), ("TX", "Austin", "Travis County", "787", 30.27, -97.74),
+    ("TX", "El Paso", "El Paso County", "799", 31.76, -106.49), ("UT", "Salt Lake City", "Salt Lake County", "841", 40.76, -111.89),
+    ("VT", "Burlington", "Chittenden County", "054", 44.48, -73.21), ("VA", "Virginia Beach", "Virginia Beach City", "234", 36.85, -75.98),
+    ("VA", "Richmond", "Richmond City", "232", 37.54, -77.44), ("WA", "Seattle", "King County", "981", 47.61, -122.33),
+    ("WV", "Charleston", "Kanawha County", "253", 38.35, -81.63), ("WI", "Milwaukee", "Milwaukee County", "532", 43.04, -87.91),
+    ("WY", "Cheyenne", "Laramie County", "820", 41.14, -104.82), ("PR", "San Juan", "San Juan Municipio", "009", 18.47, -66.11),
+]
+TOWNS = ["Springfield", "Franklin", "Clinton", "Greenville", "Salem", "Madison", "Georgetown",
+         "Marion", "Fairview", "Riverside", "Oxford", "Jackson", "Milton", "Lebanon", "Ashland"]
+NAMES = ["Lincoln", "Washington", "Jefferson", "Roosevelt", "Kennedy", "Franklin", "Oak Grove",
+         "Pine Ridge", "Lakeview", "Hillcrest", "Riverside", "Maple", "Cedar", "Sunset", "Valley",
+         "Eastside", "Westwood", "Highland", "Parkway", "Central", "Meadow Creek", "Stonebridge"]
+STREETS = ["Main", "Oak", "Maple", "School", "Park", "Church", "Elm", "Washington", "Lake", "Hill"]
+STREET_SUFFIXES = ["St", "Ave", "Rd", "Dr", "Ln", "Blvd"]
+# School type shares from the 2022-23 file
+SCHOOL_TYPES = [("Regular School", 92204), ("Alternative Education School", 5658),
+                ("Career and Technical School", 1622), ("Special Education School", 1906)]
+# level, lowest grade index, highest grade index, share; grade index 0 is PK, 1 KG, 14 is grade 13
+LEVELS = [("Elementary", 0, 6, 0.52), ("Middle", 7, 9, 0.16), ("High", 10, 13, 0.24),
+          ("Other", 0, 13, 0.06), ("Not Applicable", 1, 13, 0.02)]
+GRADE_NAMES = ["PK", "KG"] + [str(grade) for grade in range(1, 14)]
+CITY_LOCALES = ["11-City: Large", "12-City: Mid-size", "21-Suburb: Large", "22-Suburb: Mid-size"]
+RURAL_LOCALES = ["31-Town: Fringe", "32-Town: Distant", "41-Rural: Fringe", "42-Rural: Distant", "43-Rural: Remote"]
+# Race columns come in Male, Female, total triples, in the CSV's order
+RACE_SHARES = [0.01, 0.05, 0.15, 0.005, 0.28, 0.045, 0.46]
+
+def read_header(template_csv=TEMPLATE_CSV):
+    with open(template_csv, newline='', encoding='utf-8-sig') as csvfile:
+        return next(csv.reader(csvfile))
+
+def pick(rng, choices, size, weights=None):
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        weights = weights / weights.sum()
+    return rng.choice(len(choices), size=size, p=weights)
+
+def text(values):
+    return [str(value) for value in values]
+
+def counts_text(values, present):
+    return [str(value) if keep else '' for value, keep in zip(values.tolist(), present.tolist())]
+
+def locations(rng, size):
+    state_index = pick(rng, STATES, size, [state[6] for state in STATES])
+    state_codes = [state[0] for state in STATES]
+    metros_by_state = {}
+    for i, metro in enumerate(METROS):
+        metros_by_state.setdefault(metro[0], []).append(i)
+    states = np.array(STATES, dtype=object)
+    lats = rng.normal(states[state_index, 2].astype(np.float64), states[state_index, 4].astype(np.float64))
+    longs = rng.normal(states[state_index, 3].astype(np.float64), states[state_index, 5].astype(np.float64))
+    metro_index = np.full(size, -1)
+    in_metro = rng.random(size) < METRO_SHARE
+    for row in np.flatnonzero(in_metro):
+        options = metros_by_state[state_codes[state_index[row]]]
+        metro_index[row] = options[rng.integers(len(options))]
+    metro_rows = metro_index >= 0
+    metros = np.array([metro[4:] for metro in METROS], dtype=np.float64)
+    spread = rng.normal(0, METRO_SPREAD, size=(int(metro_rows.sum()), 2))
+    lats[metro_rows] = metros[metro_index[metro_rows], 0] + spread[:, 0]
+    longs[metro_rows] = metros[metro_index[metro_rows], 1] + spread[:, 1] * 1.3
+    return state_index, metro_index, np.clip(lats, -89.9, 89.9), np.clip(longs, -179.9, 179.9)
+
+def generate_chunk(rng, start, size):
+    state_index, metro_index, lats, longs = locations(rng, size)
+    metro_rows = metro_index >= 0
+    states = [STATES[i] for i in state_index]
+    town = pick(rng, TOWNS, size)
+    cities, counties, zips = [], [], []
+    zip_tails = rng.integers(0, 100, size)
+    rural_zips = rng.integers(100, 1000, size)
+    for row in range(size):
+        if metro_rows[row]:
+            metro = METROS[metro_index[row]]
+            cities.append(metro[1])
+            counties.append(metro[2])
+            zips.append(f"{metro[3]}{zip_tails[row]:02d}")
+        else:
+            cities.append(TOWNS[town[row]])
+            counties.append(f"{TOWNS[(town[row] + state_index[row]) % len(TOWNS)]} County")
+            zips.append(f"{(state_index[row] * 1900 + rural_zips[row] * 9) % 99000 + 1000:05d}")
+    level_index = pick(rng, LEVELS, size, [level[3] for level in LEVELS])
+    levels = np.array([level[1:3] for level in LEVELS])
+    low = levels[level_index, 0] + (rng.random(size) < 0.4) * (level_index == 0)
+    high = levels[level_index, 1]
+    school_type = pick(rng, SCHOOL_TYPES, size, [count for _, count in SCHOOL_TYPES])
+    totals = np.maximum(rng.lognormal(6.0, 0.8, size).astype(np.int64), 5)
+    grade_span = high - low + 1
+    per_grade = totals // grade_span
+    ratio = np.round(rng.uniform(10, 22, size), 1)
+    teachers = np.maximum(np.round(totals / ratio, 1), 1.0)
+    free_reduced = (totals * rng.uniform(0.1, 0.9, size)).astype(np.int64)
+    free = (free_reduced * rng.uniform(0.75, 1.0, size)).astype(np.int64)
+    males = (totals * rng.uniform(0.45, 0.55, size)).astype(np.int64)
+    race_totals = rng.multinomial(totals, RACE_SHARES)
+    race_males = (race_totals * rng.uniform(0.45, 0.55, (size, 1))).astype(np.int64)
+    ids = np.arange(start, start + size)
+    agencies = ids // 40 % 100000
+    fips = np.array([state[1] for state in states])
+    columns = [
+        text(ids + 1),
+        [f"{code:02d}{row:010d}" for code, row in zip(fips.tolist(), ids.tolist())],
+        ["2022-2023"] * size,
+        [state[0] for state in states],
+        [f"{code:02d}{agency:05d}" for code, agency in zip(fips.tolist(), agencies.tolist())],
+        [f"{state[0]}-{agency}" for state, agency in zip(states, agencies.tolist())],
+        [f"{city} School District" for city in cities],
+        [f"{NAMES[name]} {LEVELS[level][0] if level < 3 else 'Community'} School"
+         for name, level in zip(rng.integers(len(NAMES), size=size).tolist(), level_index.tolist())],
+        [f"{number} {STREETS[street]} {STREET_SUFFIXES[suffix]}" for number, street, suffix in zip(
+            rng.integers(1, 9999, size).tolist(), rng.integers(len(STREETS), size=size).tolist(),
+            rng.integers(len(STREET_SUFFIXES), size=size).tolist())],
+        [""] * size,
+        cities,
+        [state[0] for state in states],
+        zips,
+        ["    "] * size,
+        [f"({area}){prefix}-{line:04d}" for area, prefix, line in zip(
+            rng.integers(201, 990, size).tolist(), rng.integers(200, 999, size).tolist(),
+            rng.integers(0, 10000, size).tolist())],
+        np.where(rng.random(size) < 0.08, "Yes", "No").tolist(),
+        np.where(rng.random(size) < 0.02, "Full Virtual", "Not Virtual").tolist(),
+        [GRADE_NAMES[grade] for grade in low.tolist()],
+        [GRADE_NAMES[grade] for grade in high.tolist()],
+        [LEVELS[level][0] for level in level_index.tolist()],
+        ["1"] * size,
+        [SCHOOL_TYPES[kind][0] for kind in school_type.tolist()],
+        ["Currently operational "] * size,
+        [CITY_LOCALES[i % 4] if metro else RURAL_LOCALES[i % 5]
+         for i, metro in zip(rng.integers(0, 20, size).tolist(), metro_rows.tolist())],
+        counties,
+        text(free_reduced), text(free), text(free_reduced - free),
+        text((free * rng.uniform(0.6, 1.0, size)).astype(np.int64)),
+    ]
+    for grade in range(len(GRADE_NAMES)):
+        columns.append(counts_text(per_grade, (low <= grade) & (grade <= high)))
+    # Ungraded and adult education counts are blank for almost every school
+    columns += [[""] * size, [""] * size]
+    columns += [text(males), text(totals - males), text(totals), text(totals),
+                text(teachers), text(ratio)]
+    for race_index in range(len(RACE_SHARES)):
+        race_male = race_males[:, race_index]
+        race_total = race_totals[:, race_index]
+        columns += [text(race_male), text(race_total - race_male), text(race_total)]
+    columns += [[f"{lat:.6f}" for lat in lats.tolist()], [f"{long:.6f}" for long in longs.tolist()]]
+    return list(zip(*columns))
+
+def generate_rows(count, seed=1, chunk_size=CHUNK_SIZE):
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, chunk_size):
+        yield generate_chunk(rng, start, min(chunk_size, count - start))
+
+def write_school_csv(csv_file, count, seed=1, chunk_size=CHUNK_SIZE):
+    header = read_header()
+    with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        for rows in generate_rows(count, seed, chunk_size):
+            if len(rows[0]) != len(header):
+                raise ValueError(f"Generated {len(rows[0])} columns, expected {len(header)}")
+            writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic school_data CSV for load and benchmark runs.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("csv_file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    write_school_csv(args.csv_file, args.rows, args.seed)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.rows:,} rows to {args.csv_file} in {elapsed:.2f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
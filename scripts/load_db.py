@@ -1,50 +1,551 @@
-import pandas as pd
+import argparse
+import csv
+import hashlib
+import os
 import sqlite3
 import re
-import numpy as np
+import sys
+import time
 
-def replace_nulls_with_zero(df):
-    numeric_columns = df.select_dtypes(include=[np.number]).columns
-    df[numeric_columns] = df[numeric_columns].fillna(0)
-    for col in numeric_columns:
-        if df[col].dtype == 'float64' and df[col].notna().all() and (df[col] % 1 == 0).all():
-            df[col] = df[col].astype(int)
-    return df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine.snapshot import invalidate_snapshot, read_manifest, snapshot_path, snapshot_status
+from engine.store import verify_store_snapshot, write_store_snapshot
+from engine.summaries import SUMMARY_GRAINS, TYPE_COLUMN, has_summaries, summary_columns, summary_select
+from engine.text_search import PREFIX_LENGTHS, TEXT_SEARCH_COLUMNS, TOKENIZER
+
+LOAD_CHUNK_SIZE = 10000
+# Same markers pandas.read_csv treats as missing, so inferred types match the old loader
+NULL_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -200000",
+    "PRAGMA temp_store = MEMORY",
+]
+# Columns the Query tab and the store filter on most, the composite index also
+# serves state-only filters
+SECONDARY_INDEXES = [
+    ["location_state", "county_name"],
+    ["location_5_digit_zip_code"],
+    ["school_type_description"],
+    ["school_level"],
+    ["unique_school_id"],
+]
+# Refreshes update a live database in place, so they keep the journal and fsyncs
+REFRESH_PRAGMAS = [
+    "PRAGMA cache_size = -200000",
+    "PRAGMA temp_store = MEMORY",
+]
+KEY_COLUMN = "unique_school_id"
+# The app's snapshot only covers the table the school store reads
+SNAPSHOT_SOURCE_TABLE = "school_data"
+REMOVED_MODES = ["keep", "delete", "tombstone"]
+RESTORE_PRAGMAS = [
+    "PRAGMA journal_mode = DELETE",
+    "PRAGMA synchronous = FULL",
+]
 
 def snake_case(word):
     base_word = re.sub(r'[^a-zA-Z0-9\s]', '', word.strip())
     words = base_word.lower().split()
     return '_'.join(words)
-    
-def seed_data(csv_file, db_file, table_name):
-    df = pd.read_csv(csv_file)
-    df.columns = [snake_case(col) for col in df.columns]
-    df = replace_nulls_with_zero(df)
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    df.to_sql(table_name, conn, if_exists='replace', index=False)
-    numeric_columns = df.select_dtypes(include=[np.number]).columns
-    for column in numeric_columns:
+
+def read_csv_rows(csv_file):
+    with open(csv_file, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        headers = next(reader, None)
+        if headers is None:
+            raise ValueError(f"{csv_file} is empty")
+        yield [snake_case(header) for header in headers]
+        yield from reader
+
+def value_type(value):
+    try:
+        int(value)
+        return 'INTEGER'
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return 'TEXT'
+    return 'INTEGER' if number.is_integer() else 'NUMERIC'
+
+def infer_schema(csv_file):
+    rows = read_csv_rows(csv_file)
+    columns = next(rows)
+    affinities = [None] * len(columns)
+    for row in rows:
+        for i, value in enumerate(row[:len(columns)]):
+            if affinities[i] == 'TEXT' or value in NULL_VALUES:
+                continue
+            kind = value_type(value)
+            if affinities[i] is None or kind == 'TEXT':
+                affinities[i] = kind
+            elif kind == 'NUMERIC':
+                affinities[i] = 'NUMERIC'
+    # Columns with no values at all were float NaN in pandas, filled with 0
+    return [(column, affinity or 'INTEGER') for column, affinity in zip(columns, affinities)]
+
+def create_table(cursor, table_name, schema):
+    cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    cursor.execute(f'DROP TABLE IF EXISTS "{table_name}_hashes"')
+    drop_spatial_index(cursor, table_name)
+    if table_name == SNAPSHOT_SOURCE_TABLE:
+        invalidate_snapshot(cursor)
+    definitions = []
+    for column, affinity in schema:
+        default = "" if affinity == 'TEXT' else " DEFAULT 0"
+        definitions.append(f'"{column}" {affinity}{default}')
+    cursor.execute(f'CREATE TABLE "{table_name}" ({", ".join(definitions)})')
+
+def is_null(value):
+    return value is None or value in NULL_VALUES
+
+def to_text(value):
+    return None if is_null(value) else value
+
+def to_integer(value):
+    if is_null(value):
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+def to_numeric(value):
+    return 0 if is_null(value) else float(value)
+
+CONVERTERS = {'TEXT': to_text, 'INTEGER': to_integer, 'NUMERIC': to_numeric}
+
+def column_affinity(declared_type):
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type:
+        return 'INTEGER'
+    if not declared_type or any(name in declared_type for name in ('CHAR', 'CLOB', 'TEXT', 'BLOB')):
+        return 'TEXT'
+    return 'NUMERIC'
+
+def table_schema(cursor, table_name):
+    columns = cursor.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    if not columns:
+        raise ValueError(f"Table {table_name} does not exist, load it first")
+    return [(column[1], column_affinity(column[2])) for column in columns]
+
+def row_converter(schema):
+    converters = [CONVERTERS[affinity] for _, affinity in schema]
+    width = len(converters)
+
+    def convert(row):
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        return [convert_value(value) for convert_value, value in zip(converters, row)]
+    return convert
+
+def insert_rows(cursor, table_name, schema, rows, chunk_size=LOAD_CHUNK_SIZE, on_chunk=None):
+    columns = ", ".join(f'"{column}"' for column, _ in schema)
+    placeholders = ", ".join("?" for _ in schema)
+    statement = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})'
+    convert = row_converter(schema)
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(convert(row))
+        if len(chunk) == chunk_size:
+            cursor.executemany(statement, chunk)
+            total += len(chunk)
+            chunk = []
+            if on_chunk:
+                on_chunk(total)
+    if chunk:
+        cursor.executemany(statement, chunk)
+        total += len(chunk)
+        if on_chunk:
+            on_chunk(total)
+    return total
+
+def drop_spatial_index(cursor, table_name):
+    # Older databases carry an R*Tree and its triggers, nothing reads them
+    # since the store answers radius searches from memory
+    index_table = f"{table_name}_rtree"
+    for action in ("insert", "update", "delete"):
+        cursor.execute(f'DROP TRIGGER IF EXISTS "{index_table}_{action}"')
+    cursor.execute(f'DROP TABLE IF EXISTS "{index_table}"')
+
+def build_text_index(cursor, table_name, schema):
+    # External content FTS5 table, it keeps only the index and reads the
+    # text back from the table itself
+    existing = {column for column, _ in schema}
+    if not existing.issuperset(TEXT_SEARCH_COLUMNS):
+        print("Skipping text index: column missing")
+        return None
+    index_table = f"{table_name}_fts"
+    cursor.execute(f'DROP TABLE IF EXISTS "{index_table}"')
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE "{index_table}" USING fts5(
+            {", ".join(TEXT_SEARCH_COLUMNS)},
+            content='{table_name}', tokenize='{TOKENIZER}', prefix='{PREFIX_LENGTHS}')
+    """)
+    cursor.execute(f"INSERT INTO \"{index_table}\" (\"{index_table}\") VALUES ('rebuild')")
+    build_text_triggers(cursor, table_name)
+    return index_table
+
+def build_text_triggers(cursor, table_name):
+    # An external content index has to be told the old text to remove it
+    index_table = f"{table_name}_fts"
+    columns = ", ".join(TEXT_SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in TEXT_SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in TEXT_SEARCH_COLUMNS)
+    insert = f'INSERT INTO "{index_table}" (rowid, {columns}) VALUES (new.rowid, {new_values});'
+    delete = (f'INSERT INTO "{index_table}" ("{index_table}", rowid, {columns}) '
+              f"VALUES ('delete', old.rowid, {old_values});")
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{index_table}_insert"')
+    cursor.execute(f'CREATE TRIGGER "{index_table}_insert" AFTER INSERT ON "{table_name}" BEGIN {insert} END')
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{index_table}_update"')
+    cursor.execute(f'CREATE TRIGGER "{index_table}_update" AFTER UPDATE OF {columns} ON "{table_name}" '
+                   f'BEGIN {delete} {insert} END')
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{index_table}_delete"')
+    cursor.execute(f'CREATE TRIGGER "{index_table}_delete" AFTER DELETE ON "{table_name}" BEGIN {delete} END')
+
+def build_summary_tables(cursor, table_name, schema):
+    # State, county and ZIP rollups for the Summaries tab, rebuilt whole
+    # after every load or refresh that changes rows, a GROUP BY over the
+    # national table takes a fraction of a second
+    existing = {column for column, _ in schema}
+    if not existing.issuperset(summary_columns()):
+        print("Skipping summary tables: column missing")
+        return []
+    tables = []
+    for suffix, keys in SUMMARY_GRAINS.values():
+        summary_table = f"{table_name}_{suffix}"
+        cursor.execute(f'DROP TABLE IF EXISTS "{summary_table}"')
+        cursor.execute(f'CREATE TABLE "{summary_table}" AS {summary_select(table_name, keys)}')
+        # Rollups group and sort by the grain's columns, the index hands them over in order
+        index_columns = ", ".join(f'"{column}"' for column in keys + [TYPE_COLUMN])
+        cursor.execute(f'CREATE INDEX "idx_{summary_table}" ON "{summary_table}" ({index_columns})')
+        tables.append(summary_table)
+    return tables
+
+def build_indexes(cursor, table_name, schema):
+    existing = {column for column, _ in schema}
+    indexes = []
+    for columns in SECONDARY_INDEXES:
+        if not existing.issuperset(columns):
+            print(f"Skipping index on {', '.join(columns)}: column missing")
+            continue
+        index_name = f"idx_{table_name}_{'_'.join(columns)}"
+        cursor.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        cursor.execute(f'CREATE INDEX "{index_name}" ON "{table_name}" ({column_list})')
+        indexes.append(index_name)
+    return indexes
+
+def finalize_table(cursor, table_name, schema):
+    indexes = build_indexes(cursor, table_name, schema)
+    text_index = build_text_index(cursor, table_name, schema)
+    summaries = build_summary_tables(cursor, table_name, schema)
+    return indexes, text_index, summaries
+
+def row_hash(values):
+    # Integral floats read back from NUMERIC columns as ints, hash them the same way
+    normalized = [int(value) if isinstance(value, float) and value.is_integer() else value
+                  for value in values]
+    return hashlib.blake2b(repr(normalized).encode('utf-8'), digest_size=16).hexdigest()
+
+def source_hash(row):
+    return hashlib.blake2b(repr(row).encode('utf-8'), digest_size=16).hexdigest()
+
+def load_hashes(cursor, table_name, schema):
+    # row_hash covers the stored values, source_hash the incoming row exactly as
+    # last seen, which lets unchanged rows skip type conversion entirely
+    hash_table = f"{table_name}_hashes"
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{hash_table}" '
+                   f'({KEY_COLUMN} PRIMARY KEY, row_hash TEXT NOT NULL, source_hash TEXT)')
+    hashes = {key: (digest, source) for key, digest, source in
+              cursor.execute(f'SELECT {KEY_COLUMN}, row_hash, source_hash FROM "{hash_table}"')}
+    if hashes:
+        return hashes
+    # First refresh after a full load, hash what is already there
+    columns = ", ".join(f'"{column}"' for column, _ in schema)
+    key_index = [column for column, _ in schema].index(KEY_COLUMN)
+    rows = cursor.execute(f'SELECT {columns} FROM "{table_name}"').fetchall()
+    for values in rows:
+        hashes[values[key_index]] = (row_hash(values), None)
+    if len(hashes) < len(rows):
+        raise ValueError(f"{KEY_COLUMN} is not unique in {table_name}, run a full load instead")
+    if hashes:
+        print(f"Hashed {len(hashes):,} existing rows")
+        cursor.executemany(f'INSERT INTO "{hash_table}" VALUES (?, ?, ?)',
+                           ((key, digest, source) for key, (digest, source) in hashes.items()))
+    return hashes
+
+class TableRefresh:
+    # Diffs incoming rows against the table on KEY_COLUMN using a stored hash
+    # per row, so only new, changed and removed schools are written
+    def __init__(self, cursor, table_name, columns, removed="keep"):
+        if removed not in REMOVED_MODES:
+            raise ValueError(f"removed must be one of {', '.join(REMOVED_MODES)}")
+        self.cursor = cursor
+        self.table_name = table_name
+        self.hash_table = f"{table_name}_hashes"
+        self.removed = removed
+        self.schema = table_schema(cursor, table_name)
+        table_columns = [column for column, _ in self.schema]
+        missing = [column for column in table_columns if column not in columns]
+        extra = [column for column in columns if column not in table_columns]
+        if missing or extra:
+            raise ValueError(f"Columns do not match {table_name} (missing: {', '.join(missing) or 'none'}, "
+                             f"extra: {', '.join(extra) or 'none'}), run a full load instead")
+        if KEY_COLUMN not in table_columns:
+            raise ValueError(f"{table_name} has no {KEY_COLUMN} column")
+        self.positions = [columns.index(column) for column in table_columns]
+        self.width = len(columns)
+        self.convert = row_converter(self.schema)
+        self.key_index = table_columns.index(KEY_COLUMN)
+        self.key_position = self.positions[self.key_index]
+        self.key_convert = CONVERTERS[self.schema[self.key_index][1]]
+        self.hashes = load_hashes(cursor, table_name, self.schema)
+        drop_spatial_index(cursor, table_name)
+        # Older loads also indexed location_state alone, the composite covers it
+        cursor.execute(f'DROP INDEX IF EXISTS "idx_{table_name}_location_state"')
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table_name}_fts",)).fetchone():
+            build_text_triggers(cursor, table_name)
+        self.seen = set()
+        self.counts = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        column_list = ", ".join(f'"{column}"' for column in table_columns)
+        placeholders = ", ".join("?" for _ in table_columns)
+        assignments = ", ".join(f'"{column}" = ?' for column in table_columns)
+        self.insert_statement = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})'
+        self.update_statement = f'UPDATE "{table_name}" SET {assignments} WHERE {KEY_COLUMN} = ?'
+
+    def apply(self, rows):
+        inserts = []
+        updates = []
+        changed_hashes = []
+        for row in rows:
+            if len(row) < self.width:
+                row = list(row) + [''] * (self.width - len(row))
+            key = self.key_convert(row[self.key_position])
+            self.seen.add(key)
+            source = source_hash(row)
+            current, current_source = self.hashes.get(key, (None, None))
+            if source == current_source:
+                self.counts["unchanged"] += 1
+                continue
+            values = self.convert([row[position] for position in self.positions])
+            digest = row_hash(values)
+            if digest == current:
+                self.counts["unchanged"] += 1
+                self.hashes[key] = (digest, source)
+                changed_hashes.append((key, digest, source))
+                continue
+            if current is None:
+                inserts.append(values)
+                self.counts["inserted"] += 1
+            else:
+                updates.append(values + [key])
+                self.counts["updated"] += 1
+            self.hashes[key] = (digest, source)
+            changed_hashes.append((key, digest, source))
+        self.cursor.executemany(self.insert_statement, inserts)
+        self.cursor.executemany(self.update_statement, updates)
+        self.cursor.executemany(f'INSERT OR REPLACE INTO "{self.hash_table}" VALUES (?, ?, ?)', changed_hashes)
+
+    def changed(self):
+        removed = self.counts["removed"] if self.removed != "keep" else 0
+        return self.counts["inserted"] + self.counts["updated"] + removed > 0
+
+    def finish(self):
+        removed = [key for key in self.hashes if key not in self.seen]
+        self.counts["removed"] = len(removed)
+        if self.changed() and self.table_name == SNAPSHOT_SOURCE_TABLE:
+            invalidate_snapshot(self.cursor)
+        if not removed or self.removed == "keep":
+            self.update_summaries()
+            return self.counts
+        cursor = self.cursor
+        cursor.execute("CREATE TEMP TABLE refresh_removed (key PRIMARY KEY)")
+        cursor.executemany("INSERT INTO temp.refresh_removed VALUES (?)", ((key,) for key in removed))
+        matches = f"{KEY_COLUMN} IN (SELECT key FROM temp.refresh_removed)"
+        if self.removed == "tombstone":
+            tombstones = f"{self.table_name}_tombstones"
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{tombstones}" AS '
+                           f'SELECT *, NULL AS removed_at FROM "{self.table_name}" WHERE 0')
+            cursor.execute(f'INSERT INTO "{tombstones}" SELECT *, datetime(\'now\') '
+                           f'FROM "{self.table_name}" WHERE {matches}')
+        cursor.execute(f'DELETE FROM "{self.table_name}" WHERE {matches}')
+        cursor.execute(f'DELETE FROM "{self.hash_table}" WHERE {matches}')
+        cursor.execute("DROP TABLE temp.refresh_removed")
+        self.update_summaries()
+        return self.counts
+
+    def update_summaries(self):
+        if self.changed() and has_summaries(self.cursor, self.table_name):
+            build_summary_tables(self.cursor, self.table_name, self.schema)
+
+def refresh_report(counts, removed, elapsed):
+    removed_action = {"keep": "kept", "delete": "deleted", "tombstone": "tombstoned"}[removed]
+    print(f"Inserted: {counts['inserted']:,}")
+    print(f"Updated: {counts['updated']:,}")
+    print(f"Unchanged: {counts['unchanged']:,}")
+    print(f"Removed ({removed_action}): {counts['removed']:,}")
+    print(f"Refreshed in {elapsed:.2f}s")
+
+def save_snapshot(db_file, table_name, only_if_stale=False):
+    if table_name != SNAPSHOT_SOURCE_TABLE:
+        return None
+    if only_if_stale:
+        conn = sqlite3.connect(db_file)
         try:
-            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN temp_{column} NUMERIC DEFAULT 0")
-            cursor.execute(f"UPDATE {table_name} SET temp_{column} = {column}")
-            cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN {column}")
-            cursor.execute(f"ALTER TABLE {table_name} RENAME COLUMN temp_{column} TO {column}")
-        except sqlite3.OperationalError as e:
-            print(f"Error altering column {column}: {e}")
-    conn.commit()
-    conn.close()
+            reason = snapshot_status(conn, read_manifest(snapshot_path(db_file)), table_name)
+        finally:
+            conn.close()
+        if reason is None:
+            return None
+    started = time.perf_counter()
+    manifest = write_store_snapshot(db_file)
+    print(f"Snapshot written: {snapshot_path(db_file)} ({manifest['rows']:,} rows) "
+          f"in {time.perf_counter() - started:.2f}s")
+    return manifest
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def refresh_data(csv_file, db_file, table_name, removed="keep", chunk_size=LOAD_CHUNK_SIZE):
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    for pragma in REFRESH_PRAGMAS:
+        cursor.execute(pragma)
+    try:
+        cursor.execute("BEGIN")
+        rows = read_csv_rows(csv_file)
+        refresh = TableRefresh(cursor, table_name, next(rows), removed)
+        for chunk in chunked(rows, chunk_size):
+            refresh.apply(chunk)
+        counts = refresh.finish()
+        cursor.execute("COMMIT")
+        cursor.execute("PRAGMA optimize")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    refresh_report(counts, removed, time.perf_counter() - started)
+    save_snapshot(db_file, table_name, only_if_stale=not refresh.changed())
+    return counts
+
+def load_progress(started):
+    def report(rows):
+        elapsed = time.perf_counter() - started
+        print(f"Loaded {rows:,} rows ({rows / elapsed:,.0f} rows/s)")
+    return report
+
+def seed_data(csv_file, db_file, table_name, chunk_size=LOAD_CHUNK_SIZE):
+    started = time.perf_counter()
+    schema = infer_schema(csv_file)
+    print(f"Inferred schema for {len(schema)} columns in {time.perf_counter() - started:.2f}s")
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    for pragma in BULK_LOAD_PRAGMAS:
+        cursor.execute(pragma)
+    try:
+        cursor.execute("BEGIN")
+        create_table(cursor, table_name, schema)
+        rows = read_csv_rows(csv_file)
+        next(rows)
+        load_started = time.perf_counter()
+        row_count = insert_rows(cursor, table_name, schema, rows, chunk_size, load_progress(load_started))
+        load_elapsed = time.perf_counter() - load_started
+        indexes, text_index, summaries = finalize_table(cursor, table_name, schema)
+        cursor.execute("COMMIT")
+        cursor.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        for pragma in RESTORE_PRAGMAS:
+            cursor.execute(pragma)
+        conn.close()
+    elapsed = time.perf_counter() - started
     print(f"Database created: {db_file}")
     print(f"Table created: {table_name}")
-    print(f"Number of rows: {len(df)}")
-    print(f"Columns: {', '.join(df.columns)}")
-    
+    print(f"Indexes created: {', '.join(indexes)}")
+    if text_index:
+        print(f"Text index created: {text_index}")
+    if summaries:
+        print(f"Summary tables created: {', '.join(summaries)}")
+    print(f"Number of rows: {row_count}")
+    print(f"Columns: {', '.join(column for column, _ in schema)}")
+    print(f"Inserted at {row_count / load_elapsed if load_elapsed else 0:,.0f} rows/s, finished in {elapsed:.2f}s")
+    save_snapshot(db_file, table_name)
+
+def add_to_existing(db_file, table_name, build):
+    # For databases loaded before the text index or summary tables existed
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN")
+        built = build(cursor, table_name, table_schema(cursor, table_name))
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return built, time.perf_counter() - started
+
 def main():
+    parser = argparse.ArgumentParser(description="Load the school CSV into SQLite.")
+    parser.add_argument("csv_file", nargs="?", default="../csvs/school_data.csv")
+    parser.add_argument("db_file", nargs="?", default="../db.sqlite")
+    parser.add_argument("--table", default="school_data")
+    parser.add_argument("--refresh", action="store_true",
+                        help=f"update the existing table in place, matching rows on {KEY_COLUMN}")
+    parser.add_argument("--removed", choices=REMOVED_MODES, default="keep",
+                        help="what a refresh does with rows missing from the CSV")
+    parser.add_argument("--snapshot-only", action="store_true",
+                        help="rebuild and verify the app's columnar snapshot of an existing database")
+    parser.add_argument("--text-index-only", action="store_true",
+                        help="build the school name search index in an existing database")
+    parser.add_argument("--summaries-only", action="store_true",
+                        help="build the state, county and ZIP summary tables in an existing database")
+    args = parser.parse_args()
     try:
-        seed_data("../csvs/school_data.csv", "../db.sqlite", "school_data")
-        print("loaded csv to database")
+        if args.snapshot_only:
+            save_snapshot(args.db_file, args.table)
+            problems = verify_store_snapshot(args.db_file)
+            print("\n".join(problems) if problems else "Snapshot verified against the database")
+        elif args.text_index_only:
+            text_index, elapsed = add_to_existing(args.db_file, args.table, build_text_index)
+            if text_index:
+                print(f"Text index created: {text_index} in {elapsed:.2f}s")
+        elif args.summaries_only:
+            summaries, elapsed = add_to_existing(args.db_file, args.table, build_summary_tables)
+            if summaries:
+                print(f"Summary tables created: {', '.join(summaries)} in {elapsed:.2f}s")
+        elif args.refresh:
+            refresh_data(args.csv_file, args.db_file, args.table, args.removed)
+            print("refreshed database from csv")
+        else:
+            seed_data(args.csv_file, args.db_file, args.table)
+            print("loaded csv to database")
     except Exception as e:
         print(e)
-        
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,48 +1,399 @@
-import requests, csv, time, random
+import argparse, csv, json, os, random, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+import sqlite3
+import requests
+from requests.adapters import HTTPAdapter
+from load_db import (REFRESH_PRAGMAS, REMOVED_MODES, TableRefresh, create_table,
+                     finalize_table, insert_rows, refresh_report, save_snapshot, snake_case)
 
-def extract_rows(dict_list):
-    return [list(item['attributes'].values()) for item in dict_list]
+LAYER_URL = "https://nces.ed.gov/opengis/rest/services/K12_School_Locations/EDGE_ADMINDATA_PUBLICSCH_2223/MapServer/0"
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 4.0
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+REQUEST_TIMEOUT = 60
+RETRY_STATUS = {429, 500, 502, 503, 504}
+ESRI_AFFINITIES = {
+    "esriFieldTypeOID": 'INTEGER',
+    "esriFieldTypeSmallInteger": 'INTEGER',
+    "esriFieldTypeInteger": 'INTEGER',
+    "esriFieldTypeBigInteger": 'INTEGER',
+    "esriFieldTypeDate": 'INTEGER',
+    "esriFieldTypeSingle": 'NUMERIC',
+    "esriFieldTypeDouble": 'NUMERIC',
+}
+# Keeps the rollback journal so an interrupted run leaves the table at its
+# last committed page, which is where the checkpoint resumes
+PIPELINE_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -64000",
+    "PRAGMA temp_store = MEMORY",
+]
+QUERY_PARAMS = {
+    "f": "json",
+    "where": "1=1",
+    "returnGeometry": "false",
+    "spatialRel": "esriSpatialRelIntersects",
+    "outFields": "*",
+}
 
-def query_api(offset=0):
-    url = f"https://nces.ed.gov/opengis/rest/services/K12_School_Locations/EDGE_ADMINDATA_PUBLICSCH_2223/MapServer/0/query?f=json&where=1%3D1&returnGeometry=false&spatialRel=esriSpatialRelIntersects&outFields=*&orderByFields=LSTATE%20ASC&resultOffset={offset}&resultRecordCount=50"
-    try:
-        r = requests.get(url)
-        return r.json()
-    except requests.RequestException as e:
-        print(f"Error querying api: {e}")
+class HarvestError(Exception):
+    pass
+
+class RateLimiter:
+    # Spaces request starts at least 1/rate seconds apart across all threads
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class Harvester:
+    def __init__(self, layer_url=LAYER_URL, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                 page_size=None, max_retries=MAX_RETRIES):
+        self.layer_url = layer_url.rstrip("/")
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_json(self, url, params):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                r = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+                if r.status_code in RETRY_STATUS:
+                    raise HarvestError(f"HTTP {r.status_code}")
+                r.raise_for_status()
+                data = r.json()
+                # ArcGIS reports most failures as HTTP 200 with an error body
+                if "error" in data:
+                    raise HarvestError(f"Service error: {data['error'].get('message', data['error'])}")
+                return data
+            except (requests.RequestException, ValueError, HarvestError) as e:
+                if attempt == self.max_retries:
+                    raise HarvestError(f"Giving up after {attempt + 1} attempts: {e}")
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"Error querying api: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def max_record_count(self):
+        info = self.get_json(self.layer_url, {"f": "json"})
+        return info.get("maxRecordCount") or DEFAULT_PAGE_SIZE
+
+    def record_count(self):
+        params = dict(QUERY_PARAMS, returnCountOnly="true")
+        return self.get_json(f"{self.layer_url}/query", params)["count"]
+
+    def query_page(self, offset, page_size):
+        # OBJECTID is unique, so offsets stay stable between requests
+        params = dict(QUERY_PARAMS, orderByFields="OBJECTID ASC",
+                      resultOffset=offset, resultRecordCount=page_size)
+        return self.get_json(f"{self.layer_url}/query", params)
+
+def extract_rows(dict_list, fields):
+    return [[item['attributes'].get(field) for field in fields] for item in dict_list]
+
+def layer_fields(page):
+    fields = page.get("fields")
+    if not fields:
+        fields = [{"name": name, "alias": alias} for name, alias in page["fieldAliases"].items()]
+    return {"fields": [field["name"] for field in fields],
+            "headers": [field.get("alias") or field["name"] for field in fields],
+            "types": [ESRI_AFFINITIES.get(field.get("type"), 'TEXT') for field in fields]}
+
+def layer_schema(layer):
+    return [(snake_case(header), affinity) for header, affinity in zip(layer["headers"], layer["types"])]
+
+def load_checkpoint(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
         return None
+    with open(checkpoint_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    temp_file = f"{checkpoint_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_file, checkpoint_file)
 
-def write_data(output_file):
-    loop_count = 0
-    max_size = 50
-    total_records = 0
+@contextmanager
+def transaction(cursor):
+    cursor.execute("BEGIN")
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile)
-            r_headers = query_api(offset=0)
-            if r_headers is None:
-                return
-            headers = list(r_headers["fieldAliases"].values())
-            writer.writerow(headers)
-            while True:
-                api_offset = loop_count * max_size
-                r_data = query_api(api_offset)
-                if r_data is None:
-                    break
-                data_row = r_data['features']
-                cell_rows = extract_rows(data_row)
-                writer.writerows(cell_rows)
-                csvfile.flush()
-                records_written = len(data_row)
-                total_records += records_written
-                print(f"Wrote {records_written} records. Total records: {total_records}")
-                loop_count += 1
-                random_num = random.randint(2,5)
-                time.sleep(random_num)
-                if records_written < max_size:
-                    break
-        print(f"Complete. Total records written: {total_records}")
-    except IOError as e:
-        print(f"Error writing to file: {e}")
-        
-write_data("school_data.csv")
\ No newline at end of file
+        yield
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    cursor.execute("COMMIT")
+
+class CsvOutput:
+    name = "csv"
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.csvfile = None
+        self.writer = None
+
+    def exists(self):
+        return os.path.exists(self.output_file)
+
+    def open(self, layer, state):
+        if state is None:
+            self.csvfile = open(self.output_file, 'w', newline='', encoding='utf-8-sig')
+            self.writer = csv.writer(self.csvfile)
+            self.writer.writerow(layer["headers"])
+            return
+        # Drop anything written after the last checkpoint, it is fetched again
+        self.csvfile = open(self.output_file, 'r+', newline='', encoding='utf-8-sig')
+        self.csvfile.seek(state["bytes"])
+        self.csvfile.truncate()
+        self.writer = csv.writer(self.csvfile)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.csvfile.flush()
+
+    def state(self):
+        return {"bytes": self.csvfile.tell()}
+
+    def finish(self):
+        self.close()
+        print(f"CSV written: {self.output_file}")
+
+    def close(self):
+        if self.csvfile is not None:
+            self.csvfile.close()
+            self.csvfile = None
+
+class SqliteOutput:
+    name = "sqlite"
+
+    def __init__(self, db_file, table_name="school_data"):
+        self.db_file = db_file
+        self.table_name = table_name
+        self.conn = None
+        self.schema = None
+        self.rows = 0
+
+    def exists(self):
+        return os.path.exists(self.db_file)
+
+    def open(self, layer, state):
+        self.schema = layer_schema(layer)
+        self.conn = sqlite3.connect(self.db_file, isolation_level=None)
+        cursor = self.conn.cursor()
+        for pragma in PIPELINE_PRAGMAS:
+            cursor.execute(pragma)
+        with transaction(cursor):
+            if state is None:
+                create_table(cursor, self.table_name, self.schema)
+                self.rows = 0
+            else:
+                # Rows are appended in order, anything past the checkpoint is fetched again
+                cursor.execute(f'DELETE FROM "{self.table_name}" WHERE rowid > ?', (state["rows"],))
+                self.rows = state["rows"]
+
+    def write(self, rows):
+        cursor = self.conn.cursor()
+        with transaction(cursor):
+            self.rows += insert_rows(cursor, self.table_name, self.schema, rows)
+
+    def state(self):
+        return {"rows": self.rows}
+
+    def finish(self):
+        cursor = self.conn.cursor()
+        with transaction(cursor):
+            indexes, text_index, summaries = finalize_table(cursor, self.table_name, self.schema)
+        cursor.execute("ANALYZE")
+        self.close()
+        print(f"Table written: {self.db_file} {self.table_name}, {self.rows:,} rows")
+        print(f"Indexes created: {', '.join(indexes)}")
+        if text_index:
+            print(f"Text index created: {text_index}")
+        if summaries:
+            print(f"Summary tables created: {', '.join(summaries)}")
+        save_snapshot(self.db_file, self.table_name)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class RefreshOutput:
+    # Applies the whole harvest as one transaction against the existing table,
+    # so an interrupted refresh rolls back and has to start over
+    name = "refresh"
+
+    def __init__(self, db_file, table_name="school_data", removed="keep"):
+        self.db_file = db_file
+        self.table_name = table_name
+        self.removed = removed
+        self.conn = None
+        self.refresh = None
+        self.started = None
+
+    def exists(self):
+        return os.path.exists(self.db_file)
+
+    def open(self, layer, state):
+        if state is not None:
+            raise HarvestError("An interrupted refresh was rolled back, run again with --restart")
+        self.started = time.perf_counter()
+        self.conn = sqlite3.connect(self.db_file, isolation_level=None)
+        cursor = self.conn.cursor()
+        for pragma in REFRESH_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.execute("BEGIN")
+        columns = [snake_case(header) for header in layer["headers"]]
+        self.refresh = TableRefresh(cursor, self.table_name, columns, self.removed)
+
+    def write(self, rows):
+        self.refresh.apply(rows)
+
+    def state(self):
+        return {"rows": sum(self.refresh.counts.values())}
+
+    def finish(self):
+        counts = self.refresh.finish()
+        self.conn.execute("COMMIT")
+        self.conn.execute("PRAGMA optimize")
+        self.close()
+        refresh_report(counts, self.removed, time.perf_counter() - self.started)
+        save_snapshot(self.db_file, self.table_name, only_if_stale=not self.refresh.changed())
+
+    def close(self):
+        if self.conn is not None:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            self.conn.close()
+            self.conn = None
+
+def harvest(harvester, outputs, checkpoint_file, restart=False):
+    checkpoint = None if restart else load_checkpoint(checkpoint_file)
+    if checkpoint is not None:
+        if sorted(checkpoint["outputs"]) != sorted(output.name for output in outputs):
+            raise HarvestError(f"{checkpoint_file} was written for {', '.join(checkpoint['outputs'])} output, "
+                               "run with the same outputs or use --restart")
+        if not all(output.exists() for output in outputs):
+            print("Ignoring checkpoint, an output file is missing")
+            checkpoint = None
+    total = harvester.record_count()
+    if checkpoint is None:
+        max_page_size = harvester.max_record_count()
+        page_size = min(harvester.page_size or max_page_size, max_page_size)
+        layer = layer_fields(harvester.query_page(0, 1))
+        checkpoint = dict(layer, offset=0, rows=0, page_size=page_size, outputs={})
+        for output in outputs:
+            output.open(layer, None)
+    else:
+        page_size = checkpoint["page_size"]
+        layer = checkpoint
+        for output in outputs:
+            output.open(layer, checkpoint["outputs"][output.name])
+        print(f"Resuming at offset {checkpoint['offset']:,} ({checkpoint['rows']:,} rows already written)")
+    fields = layer["fields"]
+    offsets = iter(range(checkpoint["offset"], total, page_size))
+    started = time.perf_counter()
+    start_rows = checkpoint["rows"]
+    try:
+        with ThreadPoolExecutor(max_workers=harvester.workers) as pool:
+            # Keep a bounded window of requests in flight, but write pages in
+            # offset order so the checkpoint always covers a clean prefix
+            pending = deque((offset, pool.submit(harvester.query_page, offset, page_size))
+                            for offset in islice(offsets, harvester.workers * 2))
+            try:
+                while pending:
+                    offset, future = pending.popleft()
+                    features = future.result()["features"]
+                    if len(features) < page_size and offset + len(features) < total:
+                        raise HarvestError(f"Page at offset {offset:,} returned {len(features)} of {page_size} records")
+                    next_offset = next(offsets, None)
+                    if next_offset is not None:
+                        pending.append((next_offset, pool.submit(harvester.query_page, next_offset, page_size)))
+                    rows = extract_rows(features, fields)
+                    for output in outputs:
+                        output.write(rows)
+                    checkpoint["offset"] = offset + page_size
+                    checkpoint["rows"] += len(rows)
+                    checkpoint["outputs"] = {output.name: output.state() for output in outputs}
+                    save_checkpoint(checkpoint_file, checkpoint)
+                    elapsed = time.perf_counter() - started
+                    rate = (checkpoint["rows"] - start_rows) / elapsed if elapsed else 0
+                    print(f"Wrote {len(rows)} records. Total records: {checkpoint['rows']:,} of {total:,} ({rate:,.0f} rows/s)")
+            except BaseException:
+                for _, future in pending:
+                    future.cancel()
+                raise
+        for output in outputs:
+            output.finish()
+    finally:
+        for output in outputs:
+            output.close()
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    print(f"Complete. Total records written: {checkpoint['rows']:,}")
+    return checkpoint["rows"]
+
+def write_data(output_file, harvester=None, checkpoint_file=None, restart=False):
+    checkpoint_file = checkpoint_file or f"{output_file}.checkpoint.json"
+    return harvest(harvester or Harvester(), [CsvOutput(output_file)], checkpoint_file, restart)
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the NCES public school layer to CSV and/or SQLite.")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="CSV to write, defaults to school_data.csv unless --sqlite is given")
+    parser.add_argument("--sqlite", default=None, help="load pages straight into this database")
+    parser.add_argument("--table", default="school_data", help="table to create with --sqlite")
+    parser.add_argument("--refresh", action="store_true",
+                        help="with --sqlite, update the existing table in place instead of recreating it")
+    parser.add_argument("--removed", choices=REMOVED_MODES, default="keep",
+                        help="what a refresh does with schools missing from the harvest")
+    parser.add_argument("--url", default=LAYER_URL, help="ArcGIS layer URL, without /query")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="max requests per second, 0 for no limit")
+    parser.add_argument("--page-size", type=int, default=None, help="defaults to the layer's maxRecordCount")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--checkpoint", default=None, help="defaults to OUTPUT.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start from offset 0")
+    args = parser.parse_args()
+    if args.output is None and args.sqlite is None:
+        args.output = "school_data.csv"
+    outputs = []
+    if args.output:
+        outputs.append(CsvOutput(args.output))
+    if args.refresh and not args.sqlite:
+        parser.error("--refresh needs --sqlite")
+    if args.refresh:
+        outputs.append(RefreshOutput(args.sqlite, args.table, args.removed))
+    elif args.sqlite:
+        outputs.append(SqliteOutput(args.sqlite, args.table))
+    checkpoint_file = args.checkpoint or f"{args.output or args.sqlite}.checkpoint.json"
+    harvester = Harvester(args.url, workers=args.workers, rate=args.rate,
+                          page_size=args.page_size, max_retries=args.retries)
+    try:
+        harvest(harvester, outputs, checkpoint_file, args.restart)
+    except (HarvestError, IOError, sqlite3.Error) as e:
+        print(f"Stopped: {e}. Run again to resume from the last checkpoint.")
+
+if __name__ == "__main__":
+    main()
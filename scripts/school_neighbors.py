@@ -0,0 +1,210 @@
+import argparse, multiprocessing, os, sqlite3, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine.connections import open_read_only
+from engine.kdtree import KDTree, chord_to_distance
+from engine.store import grade_levels
+
+# For every school, its nearest K other schools, found by building one tree
+# over all the coordinates and searching it a leaf of schools at a time
+NEIGHBORS_TABLE = "school_neighbors"
+SCHOOL_COLUMNS = ["unique_school_id", "school_name", "location_city", "location_state",
+                  "school_type_description", "grades_offered_lowest", "grades_offered_highest",
+                  "latitude", "longitude"]
+SCHOOL_QUERY = f"SELECT {', '.join(SCHOOL_COLUMNS)} FROM school_data"
+NEIGHBOR_COLUMNS = ["unique_school_id", "school_name", "location_state", "neighbor_rank",
+                    "neighbor_unique_school_id", "neighbor_school_name", "distance"]
+LEAVES_PER_TASK = 32
+REPORT_SECONDS = 2
+MOST_ISOLATED = 10
+
+_tree = None
+_k = None
+
+def init_worker(lats, longs, k):
+    global _tree, _k
+    # Forked workers inherit the parent's tree. Spawned ones rebuild it from
+    # the coordinates rather than unpickling it, the build is deterministic
+    # so the leaf numbers handed out match
+    if _tree is None:
+        _tree = KDTree(lats, longs)
+    _k = k
+
+def search_leaves(leaves):
+    results = [_tree.leaf_neighbors(leaf, _k) for leaf in leaves]
+    return (np.concatenate([rows for rows, _, _ in results]),
+            np.concatenate([neighbors for _, neighbors, _ in results]),
+            np.concatenate([chords for _, _, chords in results]))
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def load_schools(db_file):
+    conn = open_read_only(db_file)
+    try:
+        return pd.read_sql_query(SCHOOL_QUERY, conn)
+    finally:
+        conn.close()
+
+def peer_mask(schools, state=None, school_type=None, grades=None):
+    # Same filters as the Find Schools tab, the schools left are both the
+    # origins and the only neighbors they can have
+    mask = np.ones(len(schools), dtype=bool)
+    if state:
+        mask &= (schools["location_state"] == state.strip().upper()).to_numpy()
+    if school_type:
+        mask &= (schools["school_type_description"] == school_type).to_numpy()
+    if grades:
+        low, high = grade_levels(grades)
+        if not np.isnan(high):
+            mask &= grade_levels(schools["grades_offered_lowest"]) <= high
+        if not np.isnan(low):
+            mask &= grade_levels(schools["grades_offered_highest"]) >= low
+    return mask
+
+def find_neighbors(lats, longs, k, workers=None, leaves_per_task=LEAVES_PER_TASK):
+    global _tree
+    started = time.perf_counter()
+    lats = np.radians(lats)
+    longs = np.radians(longs)
+    tree = KDTree(lats, longs)
+    leaves = tree.leaves()
+    total = len(tree.index)
+    print(f"Built tree over {total:,} schools in {time.perf_counter() - started:.2f}s")
+    results = []
+    done = 0
+    search_started = time.perf_counter()
+    last_report = search_started
+    _tree = tree
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(lats, longs, k)) as pool:
+        for result in pool.imap_unordered(search_leaves, chunked(leaves, leaves_per_task)):
+            results.append(result)
+            done += len(result[0])
+            now = time.perf_counter()
+            if now - last_report >= REPORT_SECONDS:
+                rate = done / (now - search_started)
+                print(f"{done:,} of {total:,} schools ({done / total:.0%}), "
+                      f"{rate:,.0f} schools/s, {(total - done) / rate:.0f}s left")
+                last_report = now
+    elapsed = time.perf_counter() - search_started
+    print(f"Searched {total:,} schools in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} schools/s)")
+    if not results:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.int64), np.empty((0, 0))
+    rows = np.concatenate([rows for rows, _, _ in results])
+    neighbors = np.concatenate([neighbors for _, neighbors, _ in results])
+    distances = chord_to_distance(np.concatenate([chords for _, _, chords in results]))
+    order = np.argsort(rows, kind='stable')
+    return rows[order], neighbors[order], distances[order]
+
+def neighbor_frame(schools, rows, neighbors, distances):
+    k = neighbors.shape[1]
+    origins = schools.iloc[np.repeat(rows, k)].reset_index(drop=True)
+    found = schools.iloc[neighbors.ravel()].reset_index(drop=True)
+    return pd.DataFrame({
+        "unique_school_id": origins["unique_school_id"],
+        "school_name": origins["school_name"],
+        "location_state": origins["location_state"],
+        "neighbor_rank": np.tile(np.arange(1, k + 1), len(rows)),
+        "neighbor_unique_school_id": found["unique_school_id"],
+        "neighbor_school_name": found["school_name"],
+        "distance": distances.ravel().round(2),
+    }, columns=NEIGHBOR_COLUMNS)
+
+def write_neighbors_table(db_file, frame):
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    columns = ["unique_school_id", "neighbor_rank", "neighbor_unique_school_id", "distance"]
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(f"DROP TABLE IF EXISTS {NEIGHBORS_TABLE}")
+        cursor.execute(f"CREATE TABLE {NEIGHBORS_TABLE} (unique_school_id, neighbor_rank INTEGER, "
+                       f"neighbor_unique_school_id, distance NUMERIC)")
+        cursor.executemany(f"INSERT INTO {NEIGHBORS_TABLE} VALUES (?, ?, ?, ?)",
+                           frame[columns].itertuples(index=False, name=None))
+        cursor.execute(f"CREATE INDEX idx_{NEIGHBORS_TABLE}_unique_school_id "
+                       f"ON {NEIGHBORS_TABLE} (unique_school_id, neighbor_rank)")
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def desert_report(schools, rows, distances, miles):
+    # Schools whose nearest peer is further than miles away, a school with
+    # no peer at all counts as infinitely far
+    nearest = distances[:, 0] if distances.shape[1] else np.full(len(rows), np.inf)
+    isolated = nearest > miles
+    deserts = schools.iloc[rows[isolated]].reset_index(drop=True)
+    deserts["nearest_peer_distance"] = nearest[isolated].round(2)
+    deserts = deserts.sort_values("nearest_peer_distance", ascending=False, kind='stable')
+    print(f"{len(deserts):,} of {len(rows):,} schools have no peer within {miles:g} miles")
+    if len(deserts):
+        by_state = deserts["location_state"].value_counts()
+        print("Most by state: " + ", ".join(f"{state} {count:,}" for state, count in by_state.head(10).items()))
+        print("Most isolated:")
+        for school in deserts.head(MOST_ISOLATED).itertuples(index=False):
+            print(f"  {school.nearest_peer_distance:8.2f} mi  {school.school_name}, "
+                  f"{school.location_city}, {school.location_state}")
+    return deserts
+
+def run_neighbors(db_file, k, csv_file=None, write_table=True, filters=None, desert_miles=None,
+                  deserts_file=None, workers=None):
+    started = time.perf_counter()
+    schools = load_schools(db_file)
+    mask = peer_mask(schools, **(filters or {}))
+    mask &= schools["latitude"].notna().to_numpy() & schools["longitude"].notna().to_numpy()
+    population = np.flatnonzero(mask)
+    print(f"Loaded {len(schools):,} schools, {len(population):,} with coordinates "
+          f"match the filters ({time.perf_counter() - started:.2f}s)")
+    rows, neighbors, distances = find_neighbors(
+        schools["latitude"].to_numpy(dtype=np.float64)[population],
+        schools["longitude"].to_numpy(dtype=np.float64)[population], k, workers)
+    # Back from positions in the filtered population to rows of school_data
+    rows = population[rows]
+    neighbors = population[neighbors]
+    frame = neighbor_frame(schools, rows, neighbors, distances)
+    if write_table:
+        write_neighbors_table(db_file, frame)
+        print(f"Wrote {len(frame):,} rows to {NEIGHBORS_TABLE}")
+    if csv_file:
+        frame.to_csv(csv_file, index=False)
+        print(f"Wrote {len(frame):,} rows to {csv_file}")
+    if desert_miles is not None:
+        deserts = desert_report(schools, rows, distances, desert_miles)
+        if deserts_file:
+            deserts.to_csv(deserts_file, index=False)
+            print(f"Wrote {len(deserts):,} schools to {deserts_file}")
+    print(f"Finished in {time.perf_counter() - started:.2f}s")
+    return frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Find every school's nearest other schools and the schools with none nearby.")
+    parser.add_argument("--db", default="../db.sqlite")
+    parser.add_argument("--k", type=int, default=5, help="nearest schools to find for each school")
+    parser.add_argument("--csv", help="also write the neighbors to this CSV")
+    parser.add_argument("--no-table", action="store_true", help=f"do not replace the {NEIGHBORS_TABLE} table")
+    parser.add_argument("--desert-miles", type=float,
+                        help="report schools with no peer within this many miles")
+    parser.add_argument("--deserts-csv", help="write the schools found by --desert-miles to this CSV")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to CPU count")
+    parser.add_argument("--state")
+    parser.add_argument("--school-type")
+    parser.add_argument("--grades", nargs=2, metavar=("LOW", "HIGH"),
+                        help="grade band peers must overlap, e.g. 9 12 or PK 5")
+    args = parser.parse_args()
+    if args.k < 1:
+        parser.error("--k must be at least 1")
+    filters = {"state": args.state, "school_type": args.school_type, "grades": args.grades}
+    try:
+        run_neighbors(args.db, args.k, args.csv, not args.no_table, filters,
+                      args.desert_miles, args.deserts_csv, args.workers)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse, json, math
+from collections import defaultdict
+
+# Aggregates the JSON lines trace logs the app writes with --trace-log, so
+# logs collected from several machines can be read together
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(math.ceil(len(values) * percent / 100) - 1, 0)
+    return values[index]
+
+def read_traces(paths, status=None, memory=False):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    print(f"Skipping {path}:{number}, not a JSON trace")
+                    continue
+                # Memory traces ran under tracemalloc, their times are not
+                # comparable with the rest
+                if trace.get("memory", False) != memory:
+                    continue
+                if status is None or trace.get("status") == status:
+                    yield trace
+
+def aggregate(traces):
+    operations = defaultdict(lambda: {"total_ms": [], "sessions": set(), "stages": defaultdict(list)})
+    for trace in traces:
+        operation = operations[trace["operation"]]
+        operation["total_ms"].append(trace["total_ms"])
+        operation["sessions"].add(trace.get("session"))
+        for stage in trace["stages"]:
+            operation["stages"][stage["name"]].append(stage)
+    return operations
+
+def print_report(operations):
+    for name, operation in sorted(operations.items()):
+        totals = operation["total_ms"]
+        print(f"{name}: {len(totals):,} traces from {len(operation['sessions']):,} sessions, "
+              f"total p50 {percentile(totals, 50):,.1f} ms, p95 {percentile(totals, 95):,.1f} ms")
+        for stage_name, stages in operation["stages"].items():
+            ms = [stage["ms"] for stage in stages]
+            line = f"  {stage_name:<16} p50 {percentile(ms, 50):10,.1f} ms  p95 {percentile(ms, 95):10,.1f} ms"
+            rows = [stage["rows"] for stage in stages if stage.get("rows") is not None]
+            if rows:
+                line += f"  rows p50 {percentile(rows, 50):,}"
+            peaks = [stage["peak_bytes"] for stage in stages if stage.get("peak_bytes") is not None]
+            if peaks:
+                line += f"  peak max {max(peaks) / 1024 ** 2:,.1f} MB"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize trace logs written with --trace-log.")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--status", choices=["finished", "cancelled", "failed"],
+                        help="only count traces that ended this way")
+    parser.add_argument("--memory", action="store_true",
+                        help="report the traces recorded with --trace-memory instead of the timed ones")
+    args = parser.parse_args()
+    print_report(aggregate(read_traces(args.logs, args.status, args.memory)))
+
+if __name__ == "__main__":
+    main()